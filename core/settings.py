@@ -80,6 +80,42 @@ DATABASES = {
     }
 }
 
+# Cache
+# LocMem is per process; the offer caches then keep their version counters in
+# the database so invalidations reach every worker. A shared backend (e.g. Redis
+# or Memcached) also shares the cached entries and saves that query.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'coderr'),
+    }
+}
+
+# Lifetime of cached offer list responses in seconds; entries are invalidated
+# on every offer change, the timeout only bounds memory use
+OFFER_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Entries of the per-process OfferDetail LRU (offers_app.detail_cache)
+OFFER_DETAIL_CACHE_SIZE = int(os.environ.get('OFFER_DETAIL_CACHE_SIZE', 2048))
+
+# Threads rendering offer image variants in the background; 0 renders them
+# inline right after the upload's transaction commits
+OFFER_IMAGE_WORKERS = int(os.environ.get('OFFER_IMAGE_WORKERS', 2))
+
+# Offer views are buffered per process and written after this many views or
+# seconds (offers_app.popularity); popularity halves after the half-life
+OFFER_VIEW_FLUSH_HITS = int(os.environ.get('OFFER_VIEW_FLUSH_HITS', 100))
+OFFER_VIEW_FLUSH_INTERVAL = int(os.environ.get('OFFER_VIEW_FLUSH_INTERVAL', 30))
+# Flush the interval from a background timer too, so idle processes do not hold views back
+OFFER_VIEW_FLUSH_TIMER = os.environ.get('OFFER_VIEW_FLUSH_TIMER', 'True') == 'True'
+OFFER_POPULARITY_HALF_LIFE_DAYS = 7
+
+# Order lists without ?cursor= are only served up to this many orders
+ORDER_UNPAGINATED_LIMIT = int(os.environ.get('ORDER_UNPAGINATED_LIMIT', 500))
+
+# The background view flush is switched off while the tests run (see core.testing)
+TEST_RUNNER = 'core.testing.TestRunner'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
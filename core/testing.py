@@ -0,0 +1,31 @@
+import re
+
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Test runner without the background view flush, whose own connection cannot see the test transactions"""
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.flush_timer_override = override_settings(OFFER_VIEW_FLUSH_TIMER=False)
+        self.flush_timer_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.flush_timer_override.disable()
+        super().teardown_test_environment(**kwargs)
+
+
+def full_table_scans(queries):
+    """EXPLAIN QUERY PLAN every captured SELECT, return the plan lines that scan a whole table"""
+    scans = []
+    with connection.cursor() as cursor:
+        for query in queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+            scans.extend(
+                f"{row[-1]}: {query['sql']}" for row in cursor.fetchall() if re.fullmatch(r'SCAN \S+', row[-1])
+            )
+    return scans
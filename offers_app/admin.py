@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Offer
+from .models import Offer, Tag
 
 
 @admin.register(Offer)
@@ -7,3 +7,11 @@ class OfferAdmin(admin.ModelAdmin):
     list_display = ['title', 'business_user', 'is_active', 'created_at']
     list_filter = ['is_active', 'created_at']
     search_fields = ['title', 'description', 'business_user__username']
+    filter_horizontal = ['tags']
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug', 'offer_count']
+    search_fields = ['name', 'slug']
+    prepopulated_fields = {'slug': ['name']}
@@ -0,0 +1,29 @@
+"""Conditional GET helpers: ETag/Last-Modified validators and 304 responses for the offer endpoints"""
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Strong ETag built from the parts that identify one representation"""
+    return quote_etag('-'.join(str(part) for part in parts))
+
+
+def not_modified_response(request, etag=None, last_modified=None):
+    """Return a 304 response carrying the validators if the client's copy is still current, else None"""
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def set_validators(response, etag=None, last_modified=None):
+    """Attach ETag/Last-Modified to a response"""
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
@@ -0,0 +1,86 @@
+import django_filters
+from django.db.models import Exists, OuterRef
+from django_filters.constants import EMPTY_VALUES
+from rest_framework.filters import SearchFilter
+
+from offers_app import features, search, tags
+from offers_app.models import OfferDetail, OfferFeature
+
+
+class OfferSearchFilter(SearchFilter):
+    """Search offers through the full-text index, ranked by relevance unless ?ordering= is given.
+
+    Falls back to DRF's icontains search when the index is not available.
+    """
+    def filter_queryset(self, request, queryset, view):
+        if not search.fts_available():
+            return super().filter_queryset(request, queryset, view)
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        queryset = search.search_offers(queryset, terms)
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get('ordering'):
+            queryset = queryset.order_by('search_rank', 'id')
+        return queryset
+
+
+class DetailExistsFilterMixin:
+    """Match offers that have at least one detail satisfying ``field_name``/``lookup_expr``.
+
+    Compiles to a correlated EXISTS subquery instead of a join on offer_details,
+    so every offer row is looked at once and no DISTINCT/GROUP BY is needed.
+    """
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        details = OfferDetail.objects.filter(
+            offer=OuterRef('pk'), **{f'{self.field_name}__{self.lookup_expr}': value}
+        )
+        return qs.filter(Exists(details))
+
+
+class DetailExistsChoiceFilter(DetailExistsFilterMixin, django_filters.ChoiceFilter):
+    pass
+
+
+class FeatureFilter(django_filters.BaseCSVFilter, django_filters.CharFilter):
+    """Match offers by comma-separated feature names through the offer_features index.
+
+    An offer matches if any of its details lists one of the names; with
+    ``match_all=True`` every name has to be listed by one of its details.
+    Names are compared normalized, so the match ignores case and extra spaces.
+    """
+    def __init__(self, *args, match_all=False, **kwargs):
+        self.match_all = match_all
+        super().__init__(*args, **kwargs)
+
+    def normalize(self, values):
+        return features.feature_names(values)
+
+    def matching(self, names):
+        """Index rows of the outer offer carrying one of names"""
+        return OfferFeature.objects.filter(offer=OuterRef('pk'), name__in=names)
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        names = self.normalize(value)
+        if not names:
+            return qs
+        if not self.match_all:
+            return qs.filter(Exists(self.matching(names)))
+        for name in names:
+            qs = qs.filter(Exists(self.matching([name])))
+        return qs
+
+
+class TagFilter(FeatureFilter):
+    """Match offers by comma-separated tag slugs (or names), any of them or with ``match_all=True`` all.
+
+    Resolves through the offer/tag link table joined to the unique tag slug.
+    """
+    def normalize(self, values):
+        return tags.tag_slugs(values)
+
+    def matching(self, names):
+        return tags.OfferTag.objects.filter(offer_id=OuterRef('pk'), tag__slug__in=names)
@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class OfferPageNumberPagination(PageNumberPagination):
+    """Page number pagination that lets clients choose the page size via ?page_size="""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class OfferCursorPagination(CursorPagination):
+    """Keyset pagination on (-updated_at, id): no COUNT query and no OFFSET scan"""
+    ordering = ('-updated_at', 'id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -11,3 +11,10 @@ class IsBusinessUserOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
         return obj.business_user == request.user
+
+
+class CanExportOffers(permissions.BasePermission):
+    """Catalogue export: staff and partner accounts holding the offers_app.export_offers permission"""
+    def has_permission(self, request, view):
+        user = request.user
+        return user.is_authenticated and (user.is_staff or user.has_perm('offers_app.export_offers'))
@@ -0,0 +1,24 @@
+import json
+
+from rest_framework.response import Response
+
+
+class PreRenderedResponse(Response):
+    """JSON response whose body is already encoded; ``data`` is only decoded when someone asks for it"""
+
+    def __init__(self, content, **kwargs):
+        self.prerendered_content = content
+        super().__init__(None, **kwargs)
+
+    @property
+    def data(self):
+        return json.loads(self.prerendered_content)
+
+    @data.setter
+    def data(self, value):
+        pass
+
+    @property
+    def rendered_content(self):
+        self['Content-Type'] = 'application/json'
+        return self.prerendered_content
@@ -1,5 +1,21 @@
+from django.db import transaction
 from rest_framework import serializers
-from ..models import Offer, OfferDetail
+from ..models import Offer, OfferDetail, Tag
+from .. import detail_cache, features, images
+from ..utils import price_as_int_or_float
+
+def tag_slugs_field(read_only=False):
+    """Tags of an offer as a list of slugs, writable unless read_only"""
+    if read_only:
+        return serializers.SlugRelatedField(many=True, read_only=True, slug_field='slug')
+    return serializers.ManyRelatedField(
+        child_relation=serializers.SlugRelatedField(
+            slug_field='slug', queryset=Tag.objects.all(),
+            error_messages={'does_not_exist': 'Unbekannter Tag: {value}.'},
+        ),
+        required=False,
+    )
+
 
 """Serializers for Offer and OfferDetail models"""
 class OfferRetrieveReferenceDetailSerializer(serializers.ModelSerializer):
@@ -18,23 +34,27 @@ class OfferRetrieveReferenceDetailSerializer(serializers.ModelSerializer):
 class OfferRetrieveFullSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(source='business_user', read_only=True)
     details = OfferRetrieveReferenceDetailSerializer(many=True, read_only=True)
+    tags = tag_slugs_field(read_only=True)
     min_price = serializers.SerializerMethodField()
     min_delivery_time = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
     class Meta:
         model = Offer
         fields = [
-            'id', 'user', 'title', 'image', 'description', 'created_at', 'updated_at',
-            'details', 'min_price', 'min_delivery_time'
+            'id', 'user', 'title', 'image', 'image_variants', 'description', 'created_at', 'updated_at',
+            'details', 'tags', 'min_price', 'min_delivery_time'
         ]
 
+    def get_image_variants(self, obj):
+        return images.variant_urls(obj, self.context.get('request'))
+
     def get_min_price(self, obj):
-        if not obj.details.exists():
+        if obj.min_price is None:
             return None
-        min_price = min([d.price for d in obj.details.all()])
-        return int(min_price) if float(min_price).is_integer() else float(min_price)
+        return int(obj.min_price) if float(obj.min_price).is_integer() else float(obj.min_price)
 
     def get_min_delivery_time(self, obj):
-        return min([d.delivery_time_in_days for d in obj.details.all()]) if obj.details.exists() else None
+        return obj.min_delivery_time
 
 """Serializer for detailed offer retrieval including all detail fields"""
 class OfferRetrieveDetailSerializer(serializers.ModelSerializer):
@@ -58,6 +78,86 @@ class OfferDetailUpdateSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'revisions', 'delivery_time_in_days', 'price', 'features', 'offer_type']
         read_only_fields = ['id']
 
+
+def build_offer_write_response(offer, details):
+    """Response body of offer create/update, built from the objects that were just written"""
+    return {
+        'id': offer.id,
+        'title': offer.title,
+        'image': offer.image.url if offer.image else None,
+        'description': offer.description,
+        'details': [
+            {
+                'id': d.id,
+                'title': d.title,
+                'revisions': d.revisions,
+                'delivery_time_in_days': d.delivery_time_in_days,
+                'price': price_as_int_or_float(d.price),
+                'features': d.features,
+                'offer_type': d.offer_type
+            }
+            for d in sorted(details, key=lambda d: (d.price, d.id))
+        ]
+    }
+
+
+def save_offer_diff(instance, validated_data, details_data, match_offer_type=False, delete_missing=False):
+    """Apply an offer update as a diff against the database inside one transaction.
+
+    Only changed offer columns are written; details are matched by id (and
+    optionally by offer_type) and written with one batched create, update and
+    delete each, so the statement count does not grow with the number of tiers.
+    Returns the resulting list of details.
+    """
+    with transaction.atomic():
+        changed_fields = [attr for attr, value in validated_data.items() if getattr(instance, attr) != value]
+        for attr in changed_fields:
+            setattr(instance, attr, validated_data[attr])
+
+        existing = list(instance.details.all())
+        details_changed = False
+        if details_data is not None:
+            by_id = {d.id: d for d in existing}
+            by_type = {d.offer_type: d for d in existing} if match_offer_type else {}
+            to_create, to_update, update_fields, matched_ids = [], {}, set(), set()
+            for detail in details_data:
+                detail_instance = by_id.get(detail.get('id')) or by_type.get(detail.get('offer_type'))
+                if detail_instance is None:
+                    to_create.append(OfferDetail(offer=instance, **{
+                        attr: value for attr, value in detail.items() if attr != 'id'
+                    }))
+                    continue
+                matched_ids.add(detail_instance.id)
+                for attr, value in detail.items():
+                    if attr not in ['id', 'offer'] and getattr(detail_instance, attr) != value:
+                        setattr(detail_instance, attr, value)
+                        update_fields.add(attr)
+                        to_update[detail_instance.id] = detail_instance
+            to_delete = [d.id for d in existing if d.id not in matched_ids] if delete_missing else []
+
+            if to_create:
+                OfferDetail.objects.bulk_create(to_create)
+                features.sync_features(to_create, created=True)
+            if to_update:
+                OfferDetail.objects.bulk_update(to_update.values(), sorted(update_fields))
+                if 'features' in update_fields:
+                    features.sync_features(to_update.values())
+                # bulk writes send no signals
+                detail_cache.invalidate(list(to_update))
+            if to_delete:
+                OfferDetail.objects.filter(pk__in=to_delete).delete()
+            existing = [d for d in existing if d.id not in to_delete] + to_create
+            details_changed = bool(to_create or to_update or to_delete)
+            if details_changed:
+                instance.refresh_min_values(existing)
+
+        if changed_fields or details_changed:
+            instance.save(update_fields=changed_fields + ['updated_at'])
+    # Like DRF's UpdateModelMixin: drop prefetched relations that are now stale
+    instance._prefetched_objects_cache = {}
+    return existing
+
+
 """Serializer for updating Offer along with its details"""
 class OfferUpdateSerializer(serializers.ModelSerializer):
     def validate_details(self, value):
@@ -66,39 +166,20 @@ class OfferUpdateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("Jedes Angebots-Detail muss ein offer_type enthalten.")
         return value
     details = OfferDetailUpdateSerializer(many=True)
+    tags = tag_slugs_field()
 
     class Meta:
         model = Offer
-        fields = ['id', 'title', 'image', 'description', 'details']
+        fields = ['id', 'title', 'image', 'description', 'details', 'tags']
         read_only_fields = ['id']
 
     def update(self, instance, validated_data):
         details_data = validated_data.pop('details', None)
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-
-        if details_data is not None:
-            # Erst nach ID, dann nach offer_type matchen
-            existing_details_by_id = {str(d.id): d for d in instance.details.all()}
-            existing_details_by_type = {d.offer_type: d for d in instance.details.all()}
-            for detail in details_data:
-                detail_id = str(detail.get('id')) if detail.get('id') is not None else None
-                offer_type = detail.get('offer_type')
-                if detail_id and detail_id in existing_details_by_id:
-                    detail_instance = existing_details_by_id[detail_id]
-                elif offer_type and offer_type in existing_details_by_type:
-                    detail_instance = existing_details_by_type[offer_type]
-                else:
-                    detail_instance = None
-
-                if detail_instance:
-                    for attr, value in detail.items():
-                        if attr not in ['id', 'offer']:
-                            setattr(detail_instance, attr, value)
-                    detail_instance.save()
-                else:
-                    OfferDetail.objects.create(offer=instance, **detail)
+        tags = validated_data.pop('tags', None)
+        # Erst nach ID, dann nach offer_type matchen
+        self.written_details = save_offer_diff(instance, validated_data, details_data, match_offer_type=True)
+        if tags is not None:
+            instance.tags.set(tags)
         return instance
 
 
@@ -117,17 +198,22 @@ class OfferDetailReferenceSerializer(serializers.ModelSerializer):
 class OfferListSerializer(serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(source='business_user', read_only=True)
     details = OfferDetailReferenceSerializer(many=True, read_only=True)
+    tags = tag_slugs_field(read_only=True)
     user_details = serializers.SerializerMethodField()
     min_price = serializers.SerializerMethodField(read_only=True)
     min_delivery_time = serializers.SerializerMethodField(read_only=True)
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Offer
         fields = [
-            'id', 'user', 'title', 'image', 'description', 'created_at', 'updated_at',
-            'details', 'min_price', 'min_delivery_time', 'user_details'
+            'id', 'user', 'title', 'image', 'image_variants', 'description', 'created_at', 'updated_at',
+            'details', 'tags', 'min_price', 'min_delivery_time', 'user_details'
         ]
 
+    def get_image_variants(self, obj):
+        return images.variant_urls(obj, self.context.get('request'))
+
     def get_user_details(self, obj):
         user = obj.business_user
         return {
@@ -137,15 +223,12 @@ class OfferListSerializer(serializers.ModelSerializer):
         } if user else None
 
     def get_min_price(self, obj):
-        prices = obj.details.values_list('price', flat=True)
-        if not prices:
+        if obj.min_price is None:
             return None
-        min_price = min(prices)
-        return int(min_price) if float(min_price).is_integer() else float(min_price)
+        return int(obj.min_price) if float(obj.min_price).is_integer() else float(obj.min_price)
 
     def get_min_delivery_time(self, obj):
-        times = obj.details.values_list('delivery_time_in_days', flat=True)
-        return min(times) if times else None
+        return obj.min_delivery_time
 
 
 """Serializer for compact OfferDetail representation"""
@@ -207,61 +290,60 @@ class OfferSerializer(serializers.ModelSerializer):
         return value
     user = serializers.PrimaryKeyRelatedField(source='business_user', read_only=True)
     details = OfferDetailSerializer(many=True)
+    tags = tag_slugs_field()
     min_price = serializers.SerializerMethodField(read_only=True)
     min_delivery_time = serializers.SerializerMethodField(read_only=True)
+    image_variants = serializers.SerializerMethodField()
 
 
     class Meta:
         model = Offer
         fields = [
-            'id', 'user', 'title', 'image', 'description', 'created_at', 'updated_at',
-            'details', 'min_price', 'min_delivery_time'
+            'id', 'user', 'title', 'image', 'image_variants', 'description', 'created_at', 'updated_at',
+            'details', 'tags', 'min_price', 'min_delivery_time'
         ]
         read_only_fields = ['id', 'user', 'created_at', 'updated_at', 'details', 'min_price', 'min_delivery_time']
 
+    def get_image_variants(self, obj):
+        return images.variant_urls(obj, self.context.get('request'))
+
     def create(self, validated_data):
         details_data = validated_data.pop('details', [])
+        tags = validated_data.pop('tags', None)
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
             validated_data['business_user'] = request.user
-        offer = Offer.objects.create(**validated_data)
-        for detail_data in details_data:
-            OfferDetail.objects.create(offer=offer, **detail_data)
+        with transaction.atomic():
+            offer = Offer.objects.create(**validated_data)
+            details = OfferDetail.objects.bulk_create(
+                [OfferDetail(offer=offer, **detail_data) for detail_data in details_data]
+            )
+            features.sync_features(details, created=True)
+            offer.refresh_min_values(details)
+            if tags:
+                offer.tags.set(tags)
+        self.written_details = details
         return offer
 
     def get_min_price(self, obj):
-        prices = obj.details.values_list('price', flat=True)
-        if not prices:
+        if obj.min_price is None:
             return None
-        min_price = min(prices)
-        return int(min_price) if float(min_price).is_integer() else float(min_price)
+        return int(obj.min_price) if float(obj.min_price).is_integer() else float(obj.min_price)
 
     def get_min_delivery_time(self, obj):
-        times = obj.details.values_list('delivery_time_in_days', flat=True)
-        return min(times) if times else None
+        return obj.min_delivery_time
 
     def update(self, instance, validated_data):
         details_data = validated_data.pop('details', None)
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        tags = validated_data.pop('tags', None)
+        self.written_details = save_offer_diff(instance, validated_data, details_data, delete_missing=True)
+        if tags is not None:
+            instance.tags.set(tags)
+        return instance
 
-        if details_data is not None:
-            existing_details = {d.id: d for d in instance.details.all()}
-            sent_ids = set()
-            for detail in details_data:
-                detail_id = detail.get('id', None)
-                if detail_id and detail_id in existing_details:
-                    detail_instance = existing_details[detail_id]
-                    for attr, value in detail.items():
-                        if attr != 'id':
-                            setattr(detail_instance, attr, value)
-                    detail_instance.save()
-                    sent_ids.add(detail_id)
-                else:
-                    OfferDetail.objects.create(offer=instance, **detail)
-            for detail_id, detail_instance in existing_details.items():
-                if detail_id not in sent_ids:
-                    detail_instance.delete()
 
-        return instance
+"""Serializer for tags with their stored offer count"""
+class TagSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tag
+        fields = ['slug', 'name', 'offer_count']
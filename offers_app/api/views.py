@@ -4,25 +4,45 @@ from django_filters import rest_framework as filters
 from rest_framework import viewsets, permissions, mixins
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied, NotAuthenticated
+from rest_framework.exceptions import PermissionDenied, NotAuthenticated, NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.renderers import JSONRenderer
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 
-from offers_app.models import Offer, OfferDetail
+from offers_app.models import Offer, OfferDetail, Tag
+from offers_app import cache as offer_cache
+from offers_app import detail_cache
+from offers_app.importer import import_offers
+from offers_app import cards, exporter, popularity
+from offers_app.facets import offer_facets
 from .serializers import (
     OfferSerializer, OfferListSerializer, OfferUpdateSerializer,
-    OfferRetrieveFullSerializer, OfferDetailSerializer
+    OfferRetrieveFullSerializer, OfferDetailSerializer, TagSerializer, build_offer_write_response
 )
-from .permissions import IsBusinessUserOrReadOnly
+from .permissions import CanExportOffers, IsBusinessUserOrReadOnly
+from .pagination import OfferPageNumberPagination, OfferCursorPagination
+from .filters import OfferSearchFilter, DetailExistsChoiceFilter, FeatureFilter, TagFilter
+from .conditional import make_etag, not_modified_response, set_validators
+from .responses import PreRenderedResponse
 
 class OfferFilterSet(filters.FilterSet):
     creator_id = filters.NumberFilter(field_name='business_user__id')
     min_price = filters.NumberFilter(method='filter_min_price')
     def filter_min_price(self, queryset, name, value):
             return queryset.filter(min_price__gte=value)
-    max_delivery_time = filters.NumberFilter(field_name='details__delivery_time_in_days', lookup_expr='lte')
+    max_delivery_time = filters.NumberFilter(field_name='min_delivery_time', lookup_expr='lte')
+    min_rating = filters.NumberFilter(field_name='average_rating', lookup_expr='gte')
+    offer_type = DetailExistsChoiceFilter(field_name='offer_type', choices=OfferDetail.OFFER_TYPE_CHOICES)
+    features = FeatureFilter()
+    features_all = FeatureFilter(match_all=True)
+    tags = TagFilter()
+    tags_all = TagFilter(match_all=True)
 
     class Meta:
         model = Offer
-        fields = ['creator_id', 'min_price', 'max_delivery_time', 'business_user']
+        fields = ['creator_id', 'min_price', 'max_delivery_time', 'min_rating', 'offer_type', 'features', 'features_all', 'tags', 'tags_all', 'business_user']
 
 
 class OfferDetailRetrieveViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
@@ -30,6 +50,27 @@ class OfferDetailRetrieveViewSet(mixins.RetrieveModelMixin, viewsets.GenericView
     serializer_class = OfferDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_object(self):
+        """Serve the detail from the per-process LRU instead of the database"""
+        try:
+            detail = detail_cache.get_detail(int(self.kwargs['pk']))
+        except ValueError:
+            detail = None
+        if detail is None:
+            raise NotFound()
+        self.check_object_permissions(self.request, detail)
+        return detail
+
+    def retrieve(self, request, *args, **kwargs):
+        """Offer detail, answered with 304 while it has not changed"""
+        detail = self.get_object()
+        etag = make_etag('offerdetail', detail.pk, detail.cache_version, request.accepted_renderer.format)
+        response = not_modified_response(request, etag)
+        if response is not None:
+            return response
+        serializer = self.get_serializer(detail)
+        return set_validators(Response(serializer.data), etag)
+
 
 class OfferViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
@@ -51,28 +92,154 @@ class OfferViewSet(viewsets.ModelViewSet):
         from rest_framework.response import Response
         return Response({}, status=200, content_type="application/json")
     permission_classes = [IsBusinessUserOrReadOnly]
+    pagination_class = OfferPageNumberPagination
+
+    @property
+    def paginator(self):
+        """Keyset pagination when the client opts in with ?cursor=, page numbers otherwise"""
+        if not hasattr(self, '_paginator'):
+            if OfferCursorPagination.cursor_query_param in self.request.query_params:
+                self._paginator = OfferCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_permissions(self):
         if self.action == 'retrieve':
             return [permissions.IsAuthenticated(), IsBusinessUserOrReadOnly()]
+        if self.action == 'cache_stats':
+            return [permissions.IsAdminUser()]
+        if self.action == 'export':
+            return [CanExportOffers()]
         return [IsBusinessUserOrReadOnly()]
+    filter_backends = [filters.DjangoFilterBackend, OrderingFilter, OfferSearchFilter]
     filterset_class = OfferFilterSet
     search_fields = ['title', 'description']
-    ordering_fields = ['created_at', 'updated_at', 'min_price', 'min_delivery_time']
+    ordering_fields = ['created_at', 'updated_at', 'min_price', 'min_delivery_time', 'average_rating', 'popularity']
+    ordering = ['-updated_at', 'id']
+
+    def list(self, request, *args, **kwargs):
+        """List offers from their stored cards; anonymous responses are cached until an offer or offer detail changes"""
+        etag = self.list_etag(request)
+        response = not_modified_response(request, etag)
+        if response is not None:
+            return response
+        if request.accepted_renderer.format != 'json':
+            return set_validators(super().list(request, *args, **kwargs), etag)
+        if request.user.is_authenticated:
+            return set_validators(self.card_list(request), etag)
+        key = offer_cache.list_cache_key(request, *self.list_versions(request))
+        content = offer_cache.get_cached(key)
+        if content is not None:
+            return set_validators(PreRenderedResponse(content, headers={'X-Cache': 'HIT'}), etag)
+        response = self.card_list(request)
+        offer_cache.set_cached(key, response.prerendered_content)
+        response['X-Cache'] = 'MISS'
+        return set_validators(response, etag)
+
+    def card_list(self, request):
+        """Stitch the page together from the offers' pre-encoded cards instead of running the serializer"""
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.select_related(None).prefetch_related(None).defer(None).only(
+            'id', 'card', 'card_version', 'updated_at', *self.ordering_fields
+        )
+        page = self.paginate_queryset(queryset)
+        offers = page if page is not None else list(queryset)
+        cards.render_stale(offers)
+        results = cards.stitch(offers, request)
+        if page is None:
+            return PreRenderedResponse(results)
+        envelope = JSONRenderer().render(self.get_paginated_response([]).data)
+        return PreRenderedResponse(envelope.replace(b'"results":[]', b'"results":' + results, 1))
+
+    def list_etag(self, request, *extra):
+        """Validator for an offer collection: changes whenever any offer or the query changes"""
+        fingerprint = offer_cache.request_fingerprint(request, request.accepted_renderer.format, *extra)
+        return make_etag('offers', *self.list_versions(request), fingerprint)
+
+    def list_versions(self, request):
+        """List version and, for popularity-ordered lists, the ranking version; read once per request"""
+        if not hasattr(request, '_offer_list_versions'):
+            ranking = None
+            if 'popularity' in request.query_params.get(OrderingFilter.ordering_param, ''):
+                # Popularity-ordered lists also change whenever buffered views are flushed
+                ranking = popularity.get_version()
+            request._offer_list_versions = (offer_cache.get_list_version(), ranking)
+        return request._offer_list_versions
+
+    @action(detail=False, methods=['post'], url_path='bulk-import')
+    def bulk_import(self, request):
+        """Import many offers at once for the current business user, errors are reported per record"""
+        records = request.data.get('offers') if isinstance(request.data, dict) else request.data
+        if not isinstance(records, list):
+            return Response({'detail': 'Es wird eine Liste von Angeboten erwartet.'}, status=400)
+        report = import_offers(records, request.user)
+        return Response(report, status=201 if report['created'] else 400)
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """Price, delivery time and offer_type counts for the same filters as the offer list"""
+        etag = self.list_etag(request, 'facets')
+        response = not_modified_response(request, etag)
+        if response is not None:
+            return response
+        key = offer_cache.list_cache_key(request, self.list_versions(request)[0], prefix='facets')
+        data = offer_cache.get_cached(key)
+        if data is None:
+            data = offer_facets(self.filter_queryset(self.get_queryset()))
+            offer_cache.set_cached(key, data)
+        return set_validators(Response(data), etag)
+
+    @action(detail=False, methods=['get'], url_path='tags', url_name='tags')
+    def tag_counts(self, request):
+        """All tags with the number of offers carrying them, most used first"""
+        queryset = Tag.objects.order_by('-offer_count', 'name')
+        return Response(TagSerializer(queryset, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream the whole catalogue as NDJSON, one offer per line (staff and export partners)"""
+        updated_since = None
+        if request.query_params.get('updated_since'):
+            try:
+                updated_since = exporter.parse_updated_since(request.query_params['updated_since'])
+            except ValueError:
+                return Response({'detail': 'updated_since muss ein ISO-Datum oder -Zeitpunkt sein.'}, status=400)
+        lines = exporter.iter_lines(exporter.export_queryset(updated_since))
+        use_gzip = exporter.accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        response = StreamingHttpResponse(
+            exporter.gzip_stream(lines) if use_gzip else lines, content_type='application/x-ndjson'
+        )
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+    @action(detail=False, methods=['get'], url_path='cache-stats')
+    def cache_stats(self, request):
+        """Hit/miss counters of the offer list cache (admin only)"""
+        return Response(offer_cache.get_stats())
 
     def retrieve(self, request, *args, **kwargs):
-        """get a single offer with full details"""
+        """get a single offer with full details, or 304 while the client's copy is current"""
         offer = self.get_object()
+        popularity.record_view(offer.pk)
+        etag = make_etag('offer', offer.pk, offer.updated_at.timestamp(), request.accepted_renderer.format)
+        response = not_modified_response(request, etag, offer.updated_at)
+        if response is not None:
+            return response
+        prefetch_related_objects([offer], 'details', 'tags')
         serializer = OfferRetrieveFullSerializer(offer, context={'request': request})
-        return Response(serializer.data)
+        return set_validators(Response(serializer.data), etag, offer.updated_at)
 
     def get_queryset(self):
-        from django.db.models import Min
-        qs = Offer.objects.filter(is_active=True)
-        qs = qs.annotate(
-            min_price=Min('details__price'),
-            min_delivery_time=Min('details__delivery_time_in_days')
-        ).filter(min_price__isnull=False, min_delivery_time__isnull=False)
+        qs = Offer.objects.filter(
+            is_active=True, min_price__isnull=False, min_delivery_time__isnull=False
+        )
+        qs = qs.select_related('business_user').defer('card')
+        if self.action != 'retrieve':
+            # retrieve prefetches only once it knows it has to send a body
+            qs = qs.prefetch_related('details', 'tags')
         qs = qs.order_by('-updated_at', 'id')
         return qs
 
@@ -93,30 +260,7 @@ class OfferViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
-        offer = instance
-        details = offer.details.all()
-        def price_as_int_or_float(val):
-            return int(val) if float(val).is_integer() else float(val)
-        details_list = [
-            {
-                'id': d.id,
-                'title': d.title,
-                'revisions': d.revisions,
-                'delivery_time_in_days': d.delivery_time_in_days,
-                'price': price_as_int_or_float(d.price),
-                'features': d.features,
-                'offer_type': d.offer_type
-            }
-            for d in details
-        ]
-        data = {
-            'id': offer.id,
-            'title': offer.title,
-            'image': offer.image.url if offer.image else None,
-            'description': offer.description,
-            'details': details_list
-        }
-        return Response(data)
+        return Response(build_offer_write_response(serializer.instance, serializer.written_details))
 
     def update(self, request, *args, **kwargs):
         """Put an offer and return compact format"""
@@ -124,71 +268,29 @@ class OfferViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance, data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
-        offer = serializer.instance
-        details = offer.details.all()
-        def price_as_int_or_float(val):
-            return int(val) if float(val).is_integer() else float(val)
-        details_list = [
-            {
-                'id': d.id,
-                'title': d.title,
-                'revisions': d.revisions,
-                'delivery_time_in_days': d.delivery_time_in_days,
-                'price': price_as_int_or_float(d.price),
-                'features': d.features,
-                'offer_type': d.offer_type
-            }
-            for d in details
-        ]
-        data = {
-            'id': offer.id,
-            'title': offer.title,
-            'image': offer.image.url if offer.image else None,
-            'description': offer.description,
-            'details': details_list
-        }
-        return Response(data)
+        return Response(build_offer_write_response(serializer.instance, serializer.written_details))
 
     def create(self, request, *args, **kwargs):
         """Create a new Offer along with its details"""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
-        offer = serializer.instance
-        details = offer.details.all()
-        def price_as_int_or_float(val):
-            return int(val) if float(val).is_integer() else float(val)
-        details_list = [
-            {
-                'id': d.id,
-                'title': d.title,
-                'revisions': d.revisions,
-                'delivery_time_in_days': d.delivery_time_in_days,
-                'price': price_as_int_or_float(d.price),
-                'features': d.features,
-                'offer_type': d.offer_type
-            }
-            for d in details
-        ]
-        data = {
-            'id': offer.id,
-            'title': offer.title,
-            'image': offer.image.url if offer.image else None,
-            'description': offer.description,
-            'details': details_list
-        }
-        headers = self.get_success_headers(serializer.data)
-        return Response(data, status=201, headers=headers)
+        data = build_offer_write_response(serializer.instance, serializer.written_details)
+        return Response(data, status=201)
 
     @action(detail=False, methods=['get'])
     def my_offers(self, request):
         """Get offers created by the current user (paginated)"""
         if not request.user.is_authenticated:
             return Response({'detail': 'Authentication required.'}, status=401)
-        offers = Offer.objects.filter(business_user=request.user)
+        etag = self.list_etag(request, request.user.pk)
+        response = not_modified_response(request, etag)
+        if response is not None:
+            return response
+        offers = Offer.objects.filter(business_user=request.user).defer('card').prefetch_related('details', 'tags')
         page = self.paginate_queryset(offers)
         if page is not None:
             serializer = OfferSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            return set_validators(self.get_paginated_response(serializer.data), etag)
         serializer = OfferSerializer(offers, many=True)
-        return Response(serializer.data)
+        return set_validators(Response(serializer.data), etag)
@@ -5,3 +5,6 @@ class OffersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'offers_app'
     verbose_name = 'Offers'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,123 @@
+"""Response cache for the public offer list."""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+VERSION_KEY = 'offers:list:version'
+HITS_KEY = 'offers:list:hits'
+MISSES_KEY = 'offers:list:misses'
+
+# Backends private to one process; their version counters are kept in the database instead
+PER_PROCESS_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def shared_cache():
+    """Whether every worker process sees the same default cache"""
+    return settings.CACHES['default']['BACKEND'] not in PER_PROCESS_BACKENDS
+
+
+def get_version(key):
+    """Current value of a version counter shared by all worker processes"""
+    if not shared_cache():
+        from .models import CacheVersion
+        return CacheVersion.objects.filter(pk=key).values_list('value', flat=True).first() or 0
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a lost counter never revives old entries
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(*keys):
+    if not shared_cache():
+        _bump_stored_versions(keys)
+        return
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            get_version(key)
+
+
+def _bump_stored_versions(keys):
+    from .models import CacheVersion
+    if CacheVersion.objects.filter(pk__in=keys).update(value=F('value') + 1) < len(set(keys)):
+        # Start missing counters from the clock; one created concurrently is already newer than 0
+        start = int(time.time() * 1000)
+        CacheVersion.objects.bulk_create([CacheVersion(key=key, value=start) for key in keys], ignore_conflicts=True)
+
+
+def invalidate_versions(*keys):
+    """Bump version counters for a write, so entries built from the old rows are never used again"""
+    bump_version(*keys)
+    if shared_cache():
+        # The cache is not part of the transaction: bump again once the new rows are visible
+        transaction.on_commit(lambda: bump_version(*keys))
+
+
+def get_list_version():
+    return get_version(VERSION_KEY)
+
+
+def invalidate_offer_lists():
+    """Invalidate all cached offer lists"""
+    invalidate_versions(VERSION_KEY)
+
+
+def normalize_params(query_params):
+    """Sorted, blank-free query parameters, so equivalent URLs share one cache entry"""
+    items = []
+    for key in sorted(query_params.keys()):
+        values = sorted(value for value in query_params.getlist(key) if value != '')
+        items.extend((key, value) for value in values)
+    return urlencode(items)
+
+
+def request_fingerprint(request, *extra):
+    """Digest of host, normalized query parameters and any extra parts"""
+    parts = [request.build_absolute_uri('/'), normalize_params(request.query_params), *map(str, extra)]
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def list_cache_key(request, version, *extra, prefix='list'):
+    """Cache key of a list response under a list version (see get_list_version)"""
+    return f'offers:{prefix}:{version}:{request_fingerprint(request, *extra)}'
+
+
+def get_cached(key):
+    data = cache.get(key)
+    _count(HITS_KEY if data is not None else MISSES_KEY)
+    return data
+
+
+def set_cached(key, data):
+    cache.set(key, data, getattr(settings, 'OFFER_LIST_CACHE_TIMEOUT', 60 * 60 * 24))
+
+
+def get_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else None,
+        'version': get_list_version(),
+    }
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
@@ -0,0 +1,111 @@
+"""Materialized "offer cards": the list representation of an offer, stored pre-encoded."""
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from .models import Offer
+
+# Bump when the card layout changes; all stored cards become stale
+CARD_FORMAT = 2
+# Prefixes stored media paths; JSON text never holds a raw NUL, so a bytes replace swaps in the media URL
+MEDIA_MARKER = b'\x00'
+
+_renderer = JSONRenderer()
+
+
+def card_version(offer):
+    return f'{CARD_FORMAT}:{offer.updated_at.timestamp():.6f}'
+
+
+def is_current(offer):
+    return offer.card is not None and offer.card_version == card_version(offer)
+
+
+def _mark_media_urls(data):
+    """Replace media URLs in the card by unique placeholders, return {placeholder: relative path}"""
+    placeholders = {}
+
+    def mark(url):
+        if not url or not url.startswith(settings.MEDIA_URL):
+            return url
+        placeholder = f'card-media-{uuid.uuid4().hex}'
+        placeholders[placeholder] = url[len(settings.MEDIA_URL):]
+        return placeholder
+
+    data['image'] = mark(data.get('image'))
+    if data.get('image_variants'):
+        data['image_variants'] = {name: mark(url) for name, url in data['image_variants'].items()}
+    return placeholders
+
+
+def render_card(offer):
+    """Encode the list representation of an offer (details and business_user loaded)"""
+    from .api.serializers import OfferListSerializer
+    data = dict(OfferListSerializer(offer).data)
+    placeholders = _mark_media_urls(data)
+    content = _renderer.render(data)
+    for placeholder, path in placeholders.items():
+        content = content.replace(
+            _renderer.render(placeholder), b'"' + MEDIA_MARKER + _renderer.render(path)[1:]
+        )
+    return content
+
+
+def _render(offer_ids):
+    """{pk: offer} with a freshly rendered card and card_version for every given offer"""
+    rendered = {}
+    full = Offer.objects.filter(pk__in=offer_ids).select_related('business_user').prefetch_related('details', 'tags')
+    for offer in full:
+        offer.card = render_card(offer)
+        offer.card_version = card_version(offer)
+        rendered[offer.pk] = offer
+    return rendered
+
+
+def render_stale(offers):
+    """Render the stale cards among offers (loaded with at least id, card, card_version, updated_at) in memory only"""
+    stale = [offer.pk for offer in offers if not is_current(offer)]
+    if not stale:
+        return
+    rendered = _render(stale)
+    for offer in offers:
+        if offer.pk in rendered:
+            offer.card = rendered[offer.pk].card
+            offer.card_version = rendered[offer.pk].card_version
+            offer.updated_at = rendered[offer.pk].updated_at
+
+
+def refresh_cards(offer_ids, chunk_size=500):
+    """Re-render and store the stale cards of the given offers, returns their number"""
+    offer_ids = list(offer_ids)
+    stored = 0
+    for start in range(0, len(offer_ids), chunk_size):
+        chunk = Offer.objects.filter(pk__in=offer_ids[start:start + chunk_size]).only('id', 'card_version', 'updated_at')
+        stale = [offer.pk for offer in chunk if offer.card_version != card_version(offer)]
+        if stale:
+            # A row changed in the meantime gets a newer updated_at, so this write can never make it look current
+            stored += Offer.objects.bulk_update(_render(stale).values(), ['card', 'card_version'])
+    return stored
+
+
+def schedule_refresh(offer_ids):
+    """Store fresh cards for the offers once the current transaction commits, keeping list requests read-only"""
+    offer_ids = list(offer_ids)
+    if offer_ids:
+        transaction.on_commit(lambda: refresh_cards(offer_ids), robust=True)
+
+
+def stitch(offers, request):
+    """JSON array of the cards of offers with absolute media URLs for the request"""
+    media_base = request.build_absolute_uri(settings.MEDIA_URL).encode()
+    body = b','.join(bytes(offer.card) for offer in offers)
+    return b'[' + body.replace(MEDIA_MARKER, media_base) + b']'
+
+
+def invalidate_cards(**filters):
+    """Mark the cards of the matching offers as stale, e.g. after the owner was renamed, and schedule their refresh"""
+    offer_ids = list(Offer.objects.filter(**filters).values_list('pk', flat=True))
+    Offer.objects.filter(pk__in=offer_ids).update(card_version='')
+    schedule_refresh(offer_ids)
@@ -0,0 +1,65 @@
+"""Per-process LRU of OfferDetail rows, validated against a shared version per detail."""
+import copy
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import F
+
+from . import cache as offer_cache
+
+FIELDS = ('id', 'offer_id', 'title', 'revisions', 'delivery_time_in_days', 'price', 'features', 'offer_type')
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+
+
+def _version_key(pk):
+    return f'offers:details:{pk}:version'
+
+
+def invalidate(detail_ids):
+    """Mark details as changed, in this process and in all others"""
+    with _lock:
+        for pk in detail_ids:
+            _entries.pop(pk, None)
+    offer_cache.invalidate_versions(*[_version_key(pk) for pk in detail_ids])
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+
+def _lookup(pk):
+    from .models import OfferDetail
+    version = offer_cache.get_version(_version_key(pk))
+    with _lock:
+        entry = _entries.get(pk)
+        if entry is not None and entry[0] == version:
+            _entries.move_to_end(pk)
+            return version, entry[1]
+    # The version is read before the row, so a concurrent write makes this entry stale, never the next one
+    values = OfferDetail.objects.filter(pk=pk).values(*FIELDS, business_user_id=F('offer__business_user_id')).first()
+    if values is None:
+        return version, None
+    with _lock:
+        _entries[pk] = (version, values)
+        _entries.move_to_end(pk)
+        while len(_entries) > settings.OFFER_DETAIL_CACHE_SIZE:
+            _entries.popitem(last=False)
+    return version, values
+
+
+def get_detail(pk):
+    """OfferDetail by id with a stub offer (id, business_user_id), or None if it does not exist"""
+    from .models import Offer, OfferDetail
+    version, values = _lookup(pk)
+    if values is None:
+        return None
+    detail = OfferDetail(**{field: values[field] for field in FIELDS if field != 'features'})
+    detail.features = copy.deepcopy(values['features'])
+    detail.offer = Offer(id=values['offer_id'], business_user_id=values['business_user_id'])
+    # Shared version the row was read under, usable as a validator for its representation
+    detail.cache_version = version
+    return detail
@@ -0,0 +1,105 @@
+"""NDJSON export of the offer catalogue."""
+import datetime
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Offer
+from .utils import price_as_int_or_float
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def parse_updated_since(value):
+    """Parse an ISO date or datetime (naive values use the server time zone), raises ValueError"""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def export_queryset(updated_since=None):
+    """All offers (including inactive ones, so incremental pulls see deactivations) in id order"""
+    queryset = Offer.objects.select_related('business_user').defer('card').prefetch_related('details').order_by('id')
+    if updated_since is not None:
+        queryset = queryset.filter(updated_at__gte=updated_since)
+    return queryset
+
+
+def offer_record(offer):
+    user = offer.business_user
+    return {
+        'id': offer.id,
+        'user': offer.business_user_id,
+        'user_details': {'first_name': user.first_name, 'last_name': user.last_name, 'username': user.username},
+        'title': offer.title,
+        'description': offer.description,
+        'image': offer.image.url if offer.image else None,
+        'is_active': offer.is_active,
+        'min_price': price_as_int_or_float(offer.min_price),
+        'min_delivery_time': offer.min_delivery_time,
+        'average_rating': offer.average_rating,
+        'rating_count': offer.rating_count,
+        'created_at': offer.created_at,
+        'updated_at': offer.updated_at,
+        'details': [
+            {
+                'id': detail.id,
+                'title': detail.title,
+                'revisions': detail.revisions,
+                'delivery_time_in_days': detail.delivery_time_in_days,
+                'price': price_as_int_or_float(detail.price),
+                'features': detail.features,
+                'offer_type': detail.offer_type,
+            }
+            for detail in offer.details.all()
+        ],
+    }
+
+
+def iter_lines(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield one encoded NDJSON line per offer"""
+    for offer in queryset.iterator(chunk_size=chunk_size):
+        yield json.dumps(offer_record(offer), cls=DjangoJSONEncoder, ensure_ascii=False).encode() + b'\n'
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows gzip, honouring q-values (``gzip;q=0`` refuses it)"""
+    qualities = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    quality = qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0)))
+    return quality > 0
+
+
+def gzip_stream(chunks, batch_size=64 * 1024):
+    """Compress a stream of byte chunks into gzip format, emitting roughly batch_size sized blocks"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    pending = []
+    pending_size = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= batch_size:
+            data = compressor.compress(b''.join(pending))
+            pending, pending_size = [], 0
+            if data:
+                yield data
+    yield compressor.compress(b''.join(pending)) + compressor.flush()
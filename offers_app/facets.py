@@ -0,0 +1,64 @@
+"""Bucketed counts over a filtered offer queryset for the price and delivery sliders."""
+from django.db.models import Count, Max, Min, Q
+
+from .models import OfferDetail
+from .utils import price_as_int_or_float
+
+# Buckets are half-open [min, max), the last one is open-ended
+PRICE_EDGES = [0, 50, 100, 250, 500, 1000]
+DELIVERY_EDGES = [1, 3, 7, 14, 30]
+
+
+def _bucket_ranges(edges):
+    return list(zip(edges, edges[1:] + [None]))
+
+
+def _bucket_aggregates(prefix, field, edges):
+    aggregates = {}
+    for index, (low, high) in enumerate(_bucket_ranges(edges)):
+        condition = Q(**{f'{field}__gte': low})
+        if high is not None:
+            condition &= Q(**{f'{field}__lt': high})
+        aggregates[f'{prefix}_{index}'] = Count('pk', filter=condition)
+    return aggregates
+
+
+def _facet(values, prefix, edges):
+    return {
+        'min': price_as_int_or_float(values[f'{prefix}_min']),
+        'max': price_as_int_or_float(values[f'{prefix}_max']),
+        'buckets': [
+            {'min': low, 'max': high, 'count': values[f'{prefix}_{index}']}
+            for index, (low, high) in enumerate(_bucket_ranges(edges))
+        ],
+    }
+
+
+def offer_facets(queryset):
+    """Count the offers of a (filtered) queryset per price, delivery time and offer_type bucket"""
+    queryset = queryset.order_by()
+    values = queryset.aggregate(
+        count=Count('pk'),
+        price_min=Min('min_price'),
+        price_max=Max('min_price'),
+        delivery_time_min=Min('min_delivery_time'),
+        delivery_time_max=Max('min_delivery_time'),
+        **_bucket_aggregates('price', 'min_price', PRICE_EDGES),
+        **_bucket_aggregates('delivery_time', 'min_delivery_time', DELIVERY_EDGES),
+    )
+    offer_types = (
+        OfferDetail.objects.filter(offer__in=queryset.values('pk'))
+        .order_by()
+        .values('offer_type')
+        .annotate(count=Count('offer', distinct=True))
+    )
+    counts = {row['offer_type']: row['count'] for row in offer_types}
+    return {
+        'count': values['count'],
+        'price': _facet(values, 'price', PRICE_EDGES),
+        'delivery_time': _facet(values, 'delivery_time', DELIVERY_EDGES),
+        'offer_type': [
+            {'value': value, 'count': counts.get(value, 0)}
+            for value, _label in OfferDetail.OFFER_TYPE_CHOICES
+        ],
+    }
@@ -0,0 +1,52 @@
+"""Normalized index of OfferDetail.features."""
+from .models import OfferFeature
+
+
+def normalize(name):
+    return ' '.join(str(name).split()).casefold()
+
+
+def feature_names(features):
+    """Distinct normalized names of a features list, in their original order"""
+    names = []
+    for feature in features or []:
+        name = normalize(feature)[:255]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def sync_features(details, created=False):
+    """Replace the index rows of the given (saved) details by their current features.
+
+    Pass created=True for freshly inserted details, which have no rows to delete yet.
+    """
+    details = list(details)
+    if not details:
+        return
+    if not created:
+        OfferFeature.objects.filter(detail__in=[detail.pk for detail in details]).delete()
+    OfferFeature.objects.bulk_create([
+        OfferFeature(detail_id=detail.pk, offer_id=detail.offer_id, name=name)
+        for detail in details
+        for name in feature_names(detail.features)
+    ])
+
+
+def rebuild_index(batch_size=2000):
+    """Rebuild the whole index from OfferDetail.features, returns the number of rows written"""
+    from .models import OfferDetail
+    OfferFeature.objects.all().delete()
+    written = 0
+    batch = []
+    for detail in OfferDetail.objects.only('id', 'offer_id', 'features').iterator(chunk_size=batch_size):
+        batch.extend(
+            OfferFeature(detail_id=detail.pk, offer_id=detail.offer_id, name=name)
+            for name in feature_names(detail.features)
+        )
+        if len(batch) >= batch_size:
+            OfferFeature.objects.bulk_create(batch)
+            written += len(batch)
+            batch = []
+    OfferFeature.objects.bulk_create(batch)
+    return written + len(batch)
@@ -0,0 +1,128 @@
+"""Pre-rendered variants of offer images."""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import cards
+from .cache import invalidate_offer_lists
+
+logger = logging.getLogger(__name__)
+
+# name -> bounding box (width, height); images are never upscaled
+VARIANTS = {
+    'thumbnail': (160, 120),
+    'card': (480, 360),
+    'full': (1600, 1200),
+}
+JPEG_QUALITY = 82
+VARIANT_DIR = 'offers/variants'
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.OFFER_IMAGE_WORKERS, thread_name_prefix='offer-images'
+        )
+    return _executor
+
+
+def needs_render(offer):
+    """True if the stored variants do not belong to the offer's current image"""
+    source = offer.image.name if offer.image else None
+    return (offer.image_variants or {}).get('source') != source
+
+
+def schedule_render(offer_id):
+    """Render the variants of an offer once the current transaction has committed"""
+    if settings.OFFER_IMAGE_WORKERS <= 0:
+        transaction.on_commit(lambda: render_variants(offer_id))
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_run_job, offer_id))
+
+
+def _run_job(offer_id):
+    # Worker threads open their own database connection, which has to be closed again
+    close_old_connections()
+    try:
+        render_variants(offer_id)
+    except Exception:
+        logger.exception('Rendering image variants of offer %s failed', offer_id)
+    finally:
+        close_old_connections()
+
+
+def encode_variant(image, size):
+    """Resize into the bounding box and re-encode as progressive JPEG without metadata"""
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    buffer = BytesIO()
+    # Saving without exif/icc arguments drops all metadata of the upload
+    variant.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def render_variants(offer_id):
+    """Render and store all variants of the offer's current image, returns the new image_variants"""
+    from .models import Offer
+    offer = Offer.objects.filter(pk=offer_id).only('id', 'image', 'image_variants').first()
+    if offer is None or not needs_render(offer):
+        return None
+    variants = {'source': offer.image.name if offer.image else None}
+    if offer.image:
+        try:
+            with offer.image.open('rb') as source:
+                image = Image.open(source)
+                image = ImageOps.exif_transpose(image).convert('RGB')
+        except (OSError, UnidentifiedImageError):
+            logger.warning('Offer %s has no readable image, variants skipped', offer_id)
+            return None
+        stem = hashlib.md5(offer.image.name.encode()).hexdigest()[:12]
+        for name, size in VARIANTS.items():
+            path = f'{VARIANT_DIR}/{offer_id}/{stem}-{name}.jpg'
+            variants[name] = default_storage.save(path, ContentFile(encode_variant(image, size)))
+
+    # Only store the result if the image was not replaced while rendering
+    queryset = Offer.objects.filter(pk=offer_id)
+    if variants['source']:
+        queryset = queryset.filter(image=variants['source'])
+    if not queryset.update(image_variants=variants, updated_at=timezone.now()):
+        delete_variant_files(variants)
+        return None
+    delete_variant_files(offer.image_variants)
+    cards.schedule_refresh([offer_id])
+    invalidate_offer_lists()
+    return variants
+
+
+def variant_urls(offer, request=None):
+    """Map every variant name to its URL, or None while the variants are not rendered yet"""
+    variants = offer.image_variants or {}
+    if needs_render(offer):
+        variants = {}
+    urls = {}
+    for name in VARIANTS:
+        path = variants.get(name)
+        if not path:
+            urls[name] = None
+            continue
+        url = default_storage.url(path)
+        urls[name] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+def delete_variant_files(variants):
+    """Remove the rendered files listed in an image_variants value"""
+    for key, name in (variants or {}).items():
+        if key != 'source' and name:
+            default_storage.delete(name)
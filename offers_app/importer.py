@@ -0,0 +1,73 @@
+"""Bulk import of offers with their details."""
+from itertools import islice
+
+from django.db import DatabaseError, transaction
+
+from .api.serializers import OfferSerializer
+from .cache import invalidate_offer_lists
+from .models import Offer, OfferDetail
+from . import cards, features, search, tags
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def import_offers(records, business_user, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Import an iterable of offer dicts for business_user.
+
+    Returns a report with the ids of the created offers and a list of
+    {'index': ..., 'errors': ...} entries for every record that was skipped.
+    """
+    report = {'created': 0, 'offer_ids': [], 'errors': []}
+    records = enumerate(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        valid = []
+        for index, record in chunk:
+            serializer = OfferSerializer(data=record)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                report['errors'].append({'index': index, 'errors': serializer.errors})
+        if not valid:
+            continue
+        try:
+            with transaction.atomic():
+                offers = _insert_chunk([data for _, data in valid], business_user)
+        except DatabaseError as exc:
+            report['errors'].extend(
+                {'index': index, 'errors': {'non_field_errors': [str(exc)]}} for index, _ in valid
+            )
+            continue
+        report['offer_ids'].extend(offer.pk for offer in offers)
+    report['created'] = len(report['offer_ids'])
+    if report['created']:
+        cards.schedule_refresh(report['offer_ids'])
+        invalidate_offer_lists()
+    return report
+
+
+def _insert_chunk(validated, business_user):
+    offers, details_per_offer, tags_per_offer = [], [], []
+    for data in validated:
+        data = dict(data)
+        details = data.pop('details')
+        tags_per_offer.append(data.pop('tags', []))
+        offers.append(Offer(
+            business_user=business_user,
+            min_price=min(detail['price'] for detail in details),
+            min_delivery_time=min(detail['delivery_time_in_days'] for detail in details),
+            **data
+        ))
+        details_per_offer.append(details)
+    Offer.objects.bulk_create(offers)
+    details = OfferDetail.objects.bulk_create([
+        OfferDetail(offer=offer, **detail)
+        for offer, details in zip(offers, details_per_offer)
+        for detail in details
+    ])
+    features.sync_features(details, created=True)
+    tags.add_links((offer.pk, tag.pk) for offer, offer_tags in zip(offers, tags_per_offer) for tag in offer_tags)
+    search.index_offers(offers)
+    return offers
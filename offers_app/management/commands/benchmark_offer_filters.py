@@ -0,0 +1,86 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Exists, Min, OuterRef
+
+from offers_app.models import Offer, OfferDetail
+
+OFFER_TYPES = ['basic', 'standard', 'premium']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare join-based, EXISTS-based and stored-column delivery time filters on a seeded dataset. '
+        'The data is created inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--offers', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--max-delivery-time', type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options['offers'])
+                self.run(options['repeat'], options['max_delivery_time'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        start = time.perf_counter()
+        user = get_user_model().objects.create_user(username='benchmark-offers', user_type='business')
+        for offset in range(0, count, 5000):
+            numbers = range(offset, min(offset + 5000, count))
+            offers = Offer.objects.bulk_create([
+                Offer(
+                    business_user=user, title=f'Angebot {n}', description='Benchmark',
+                    min_price=50 + n % 100, min_delivery_time=n % 30 + 1
+                )
+                for n in numbers
+            ])
+            OfferDetail.objects.bulk_create([
+                OfferDetail(
+                    offer=offer, title=offer_type, offer_type=offer_type,
+                    delivery_time_in_days=n % 30 + 1 + tier * 2, price=50 + n % 100 + tier * 50
+                )
+                for n, offer in zip(numbers, offers)
+                for tier, offer_type in enumerate(OFFER_TYPES)
+            ])
+        self.stdout.write(f'Seeded {count} offers in {time.perf_counter() - start:.1f}s')
+
+    def run(self, repeat, max_days):
+        base = Offer.objects.order_by()
+        variants = {
+            # The old filter: Min annotation join plus a second join for the detail condition
+            'join': base.annotate(agg_min_price=Min('details__price'))
+                        .filter(details__delivery_time_in_days__lte=max_days),
+            'exists': base.filter(Exists(
+                OfferDetail.objects.filter(offer=OuterRef('pk'), delivery_time_in_days__lte=max_days)
+            )),
+            'column': base.filter(min_delivery_time__lte=max_days),
+        }
+        for name, queryset in variants.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                rows = len(list(queryset.values_list('pk', flat=True)))
+                timings.append((time.perf_counter() - start) * 1000)
+            self.stdout.write(
+                f'{name:<8} {rows:>8} offers  median {statistics.median(timings):8.1f} ms  '
+                f'min {min(timings):8.1f} ms'
+            )
+            if connection.vendor == 'sqlite':
+                sql, params = queryset.values_list('pk', flat=True).query.sql_with_params()
+                with connection.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                    for row in cursor.fetchall():
+                        self.stdout.write(f'           {row[-1]}')
@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from offers_app import exporter
+
+
+class Command(BaseCommand):
+    help = 'Export all offers with their details as NDJSON ("-" writes to stdout)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-')
+        parser.add_argument('--updated-since', help='Only offers changed since this ISO date/datetime')
+        parser.add_argument('--gzip', action='store_true', help='Write gzip-compressed output')
+        parser.add_argument('--chunk-size', type=int, default=exporter.DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        updated_since = None
+        if options['updated_since']:
+            try:
+                updated_since = exporter.parse_updated_since(options['updated_since'])
+            except ValueError:
+                raise CommandError(f"Invalid --updated-since value {options['updated_since']!r}.")
+
+        queryset = exporter.export_queryset(updated_since)
+        count = 0
+
+        def counted(lines):
+            nonlocal count
+            for line in lines:
+                count += 1
+                yield line
+
+        chunks = counted(exporter.iter_lines(queryset, options['chunk_size']))
+        if options['gzip']:
+            chunks = exporter.gzip_stream(chunks)
+        to_stdout = options['path'] == '-'
+        stream = sys.stdout.buffer if to_stdout else open(options['path'], 'wb')
+        try:
+            for chunk in chunks:
+                stream.write(chunk)
+        finally:
+            if not to_stdout:
+                stream.close()
+        self.stderr.write(self.style.SUCCESS(f'Exported {count} offers.'))
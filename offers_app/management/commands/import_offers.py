@@ -0,0 +1,56 @@
+import json
+import sys
+from itertools import chain
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from offers_app.importer import DEFAULT_CHUNK_SIZE, import_offers
+
+
+class Command(BaseCommand):
+    help = 'Import offers with their details from a JSON array or NDJSON file ("-" reads stdin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help='Username of the business user owning the offers')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            business_user = User.objects.get(username=options['user'], user_type='business')
+        except User.DoesNotExist:
+            raise CommandError(f"No business user named {options['user']!r}.")
+
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], encoding='utf-8')
+        try:
+            report = import_offers(read_records(stream), business_user, options['chunk_size'])
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for error in report['errors']:
+            self.stderr.write(f"Record {error['index']}: {json.dumps(error['errors'], default=str, ensure_ascii=False)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['created']} offers, skipped {len(report['errors'])} records."
+        ))
+
+
+def read_records(stream):
+    """Yield records from a JSON array or, line by line, from NDJSON"""
+    first = stream.read(1)
+    while first and first.isspace():
+        first = stream.read(1)
+    if first == '[':
+        yield from json.loads(first + stream.read())
+        return
+    for line in chain([first + stream.readline()], stream):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            # Passed on as-is so the serializer reports it under the right index
+            yield line
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from offers_app import features
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the feature index (offer_features) from OfferDetail.features'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = features.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} features.'))
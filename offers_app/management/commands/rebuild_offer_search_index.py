@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from offers_app import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for offer title/description'
+
+    def handle(self, *args, **options):
+        if not search.fts_available():
+            self.stderr.write('Full-text index not available on this database.')
+            return
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} offers.'))
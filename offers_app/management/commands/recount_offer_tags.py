@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from offers_app.tags import recount
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored offer counts of tags from the offer/tag links'
+
+    def handle(self, *args, **options):
+        repaired = recount()
+        self.stdout.write(self.style.SUCCESS(f'Repaired offer counts of {repaired} tags.'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from offers_app.cards import refresh_cards
+from offers_app.models import Offer
+
+
+class Command(BaseCommand):
+    help = 'Render and store the missing or stale list cards of all offers'
+
+    def handle(self, *args, **options):
+        stored = refresh_cards(Offer.objects.values_list('pk', flat=True))
+        self.stdout.write(self.style.SUCCESS(f'Stored {stored} offer cards.'))
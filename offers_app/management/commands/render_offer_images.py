@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from offers_app import images
+from offers_app.models import Offer
+
+
+class Command(BaseCommand):
+    help = 'Render missing or outdated image variants (thumbnail, card, full) of all offers'
+
+    def handle(self, *args, **options):
+        offers = Offer.objects.exclude(image='').exclude(image__isnull=True).only('id', 'image', 'image_variants')
+        rendered = 0
+        for offer in offers.iterator():
+            if images.needs_render(offer) and images.render_variants(offer.pk):
+                rendered += 1
+        self.stdout.write(self.style.SUCCESS(f'Rendered image variants for {rendered} offers.'))
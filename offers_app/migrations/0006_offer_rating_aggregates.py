@@ -0,0 +1,28 @@
+# Generated by Django 5.0 on 2026-10-18 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers_app', '0005_offer_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='average_rating',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='offer',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='offer',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+    ]
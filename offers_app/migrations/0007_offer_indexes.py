@@ -0,0 +1,31 @@
+# Generated by Django 5.0 on 2026-10-18 03:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers_app', '0006_offer_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='offerdetail',
+            options={'ordering': ['offer_id', 'price']},
+        ),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(condition=models.Q(('is_active', True), ('min_delivery_time__isnull', False), ('min_price__isnull', False)), fields=['-updated_at', 'id'], name='offers_listed_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['business_user', '-created_at'], name='offers_business_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='offerdetail',
+            index=models.Index(fields=['offer', 'price'], name='offer_details_offer_price_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-18 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers_app', '0007_offer_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='card',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='offer',
+            name='card_version',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+    ]
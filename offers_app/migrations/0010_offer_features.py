@@ -0,0 +1,48 @@
+# Generated by Django 5.0 on 2026-10-18 03:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_offer_features(apps, schema_editor):
+    OfferDetail = apps.get_model('offers_app', 'OfferDetail')
+    OfferFeature = apps.get_model('offers_app', 'OfferFeature')
+    rows = []
+    for detail in OfferDetail.objects.only('id', 'offer_id', 'features').iterator(chunk_size=2000):
+        names = []
+        for feature in detail.features or []:
+            name = ' '.join(str(feature).split()).casefold()[:255]
+            if name and name not in names:
+                names.append(name)
+        rows.extend(OfferFeature(detail_id=detail.pk, offer_id=detail.offer_id, name=name) for name in names)
+        if len(rows) >= 2000:
+            OfferFeature.objects.bulk_create(rows)
+            rows = []
+    OfferFeature.objects.bulk_create(rows)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers_app', '0009_offer_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OfferFeature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('detail', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feature_index', to='offers_app.offerdetail')),
+                ('offer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='offers_app.offer')),
+            ],
+            options={
+                'db_table': 'offer_features',
+                'indexes': [models.Index(fields=['name', 'offer'], name='offer_features_name_offer_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='offerfeature',
+            constraint=models.UniqueConstraint(fields=('detail', 'name'), name='offer_features_detail_name_uniq'),
+        ),
+        migrations.RunPython(backfill_offer_features, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0 on 2026-10-18 03:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers_app', '0010_offer_features'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('slug', models.SlugField(max_length=100, unique=True)),
+                ('offer_count', models.IntegerField(default=0, editable=False)),
+            ],
+            options={
+                'db_table': 'tags',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='offer',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='offers', to='offers_app.tag'),
+        ),
+    ]
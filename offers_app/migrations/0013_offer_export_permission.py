@@ -0,0 +1,17 @@
+# Generated by Django 5.0 on 2026-10-18 04:21
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers_app', '0012_cache_version'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='offer',
+            options={'ordering': ['-created_at'], 'permissions': [('export_offers', 'Can export the offer catalogue')]},
+        ),
+    ]
@@ -1,5 +1,31 @@
 from django.db import models
+from django.db.models import Min
+from django.utils import timezone
 from profiles_app.models import User
+from .cache import invalidate_offer_lists
+
+
+class CacheVersion(models.Model):
+    """Version counter of offers_app.cache, kept here while the default cache is per process"""
+    key = models.CharField(max_length=200, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'cache_versions'
+
+
+class Tag(models.Model):
+    """Category an offer can be tagged with; offer_count is maintained by offers_app.tags"""
+    name = models.CharField(max_length=100, unique=True)
+    slug = models.SlugField(max_length=100, unique=True)
+    offer_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        db_table = 'tags'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
 
 
 class Offer(models.Model):
@@ -13,24 +39,73 @@ class Offer(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     image = models.ImageField(upload_to='offers/', blank=True, null=True)
+    # Pre-rendered sizes of image, see offers_app.images
+    image_variants = models.JSONField(default=dict, blank=True)
     is_active = models.BooleanField(default=True)
+    tags = models.ManyToManyField(Tag, related_name='offers', blank=True)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, db_index=True)
+    min_delivery_time = models.IntegerField(null=True, blank=True, db_index=True)
+    # Review aggregates, maintained by reviews_app.ratings
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    average_rating = models.FloatField(default=0, db_index=True)
+    # Buffered view counter and decayed score in log space, see offers_app.popularity
+    view_count = models.IntegerField(default=0, editable=False)
+    popularity = models.FloatField(default=0, editable=False)
+    # Pre-encoded list representation, see offers_app.cards
+    card = models.BinaryField(null=True, editable=False)
+    card_version = models.CharField(max_length=40, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'offers'
         ordering = ['-created_at']
+        # Granted to partner accounts that pull the catalogue export
+        permissions = [('export_offers', 'Can export the offer catalogue')]
+        indexes = [
+            # Public offer list: only listable offers, newest first
+            models.Index(
+                fields=['-updated_at', 'id'],
+                condition=models.Q(is_active=True, min_price__isnull=False, min_delivery_time__isnull=False),
+                name='offers_listed_updated_idx',
+            ),
+            models.Index(
+                fields=['-popularity', 'id'],
+                condition=models.Q(is_active=True, min_price__isnull=False, min_delivery_time__isnull=False),
+                name='offers_listed_popularity_idx',
+            ),
+            models.Index(fields=['business_user', '-created_at'], name='offers_business_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.business_user.username}"
 
-    @property
-    def average_rating(self):
-        """Calculate average rating from reviews"""
-        reviews = self.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
-        return 0
+    def refresh_min_values(self, details=None):
+        """Recompute the stored min_price/min_delivery_time from the offer details.
+
+        Also bumps updated_at, since a detail change changes the offer, and schedules
+        the offer card refresh for it, since the queryset update sends no signal.
+        Pass the details already held in memory to skip the aggregate query.
+        """
+        from . import cards
+        if details is None:
+            values = self.details.aggregate(
+                min_price=Min('price'),
+                min_delivery_time=Min('delivery_time_in_days')
+            )
+        else:
+            details = list(details)
+            values = {
+                'min_price': min((d.price for d in details), default=None),
+                'min_delivery_time': min((d.delivery_time_in_days for d in details), default=None),
+            }
+        values['updated_at'] = timezone.now()
+        Offer.objects.filter(pk=self.pk).update(**values)
+        for attr, value in values.items():
+            setattr(self, attr, value)
+        invalidate_offer_lists()
+        cards.schedule_refresh([self.pk])
 
 
 class OfferDetail(models.Model):
@@ -49,7 +124,39 @@ class OfferDetail(models.Model):
 
     class Meta:
         db_table = "offer_details"
-        ordering = ["offer", "price"]
+        ordering = ["offer_id", "price"]
+        indexes = [
+            models.Index(fields=["offer", "price"], name="offer_details_offer_price_idx"),
+        ]
 
     def __str__(self):
         return f"{self.offer.title} - {self.offer_type}"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.offer.refresh_min_values()
+
+    def delete(self, *args, **kwargs):
+        offer = self.offer
+        result = super().delete(*args, **kwargs)
+        offer.refresh_min_values()
+        return result
+
+
+class OfferFeature(models.Model):
+    """One normalized entry of OfferDetail.features, indexed for feature filters (see offers_app.features)"""
+    detail = models.ForeignKey(OfferDetail, on_delete=models.CASCADE, related_name='feature_index')
+    offer = models.ForeignKey(Offer, on_delete=models.CASCADE, related_name='+')
+    name = models.CharField(max_length=255)
+
+    class Meta:
+        db_table = 'offer_features'
+        constraints = [
+            models.UniqueConstraint(fields=['detail', 'name'], name='offer_features_detail_name_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['name', 'offer'], name='offer_features_name_offer_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,128 @@
+"""Write-behind view counter and decayed popularity score for offers."""
+import atexit
+import datetime
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Case, F, FloatField, IntegerField, Value, When
+from django.db.models.functions import Abs, Greatest, Log, Power
+from django.utils import timezone
+
+from . import cache as offer_cache
+from .models import Offer
+
+logger = logging.getLogger(__name__)
+
+# Offer.popularity is log2(1 + sum of 2 ** view_score(t) over all views): the decayed view
+# count times a factor shared by all offers, kept in log space so it grows only linearly
+EPOCH = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+VERSION_KEY = 'offers:popularity:version'
+
+_lock = threading.Lock()
+_pending = {}
+_last_flush = time.monotonic()
+_timer = None
+# Database the buffered views were recorded against
+_database = None
+
+
+def view_score(moment=None):
+    """log2 of the weight a single view at moment adds; grows linearly, so it never overflows"""
+    moment = moment or timezone.now()
+    half_life = settings.OFFER_POPULARITY_HALF_LIFE_DAYS * 86400
+    return (moment - EPOCH).total_seconds() / half_life
+
+
+def _log2_add(score, added):
+    """log2(2 ** score + 2 ** added) without leaving log space"""
+    return Greatest(score, added) + Log(2, Value(1.0) + Power(2, -Abs(score - added)))
+
+
+def record_view(offer_id):
+    """Count one view of an offer, flushing the buffer when it is due"""
+    global _database
+    with _lock:
+        if not _pending:
+            _database = connection.settings_dict['NAME']
+        _pending[offer_id] = _pending.get(offer_id, 0) + 1
+        _schedule_flush()
+        due = (
+            sum(_pending.values()) >= settings.OFFER_VIEW_FLUSH_HITS
+            or time.monotonic() - _last_flush >= settings.OFFER_VIEW_FLUSH_INTERVAL
+        )
+    if due:
+        flush()
+
+
+def _schedule_flush():
+    """Flush the buffer after the interval even if no further view comes in (call with _lock held)"""
+    global _timer
+    if _timer is None and settings.OFFER_VIEW_FLUSH_TIMER:
+        _timer = threading.Timer(settings.OFFER_VIEW_FLUSH_INTERVAL, _flush_from_timer)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _flush_from_timer():
+    global _timer
+    with _lock:
+        _timer = None
+    try:
+        flush()
+    finally:
+        # The timer thread opened its own connection
+        connection.close()
+
+
+@atexit.register
+def _flush_at_exit():
+    """Write the views still buffered when the process shuts down"""
+    # Views recorded against a database that has been swapped since (a torn down test database) are dropped
+    if _pending and connection.settings_dict['NAME'] == _database:
+        flush()
+
+
+def flush():
+    """Write the buffered views of this process in one UPDATE, returns the number of offers touched"""
+    global _last_flush
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    if not pending:
+        return 0
+    score = view_score()
+    try:
+        Offer.objects.filter(pk__in=pending).update(
+            view_count=F('view_count') + Case(
+                *[When(pk=pk, then=Value(count)) for pk, count in pending.items()],
+                default=Value(0), output_field=IntegerField(),
+            ),
+            popularity=_log2_add(F('popularity'), Case(
+                *[When(pk=pk, then=Value(score + math.log2(count))) for pk, count in pending.items()],
+                default=Value(0.0), output_field=FloatField(),
+            )),
+        )
+    except DatabaseError:
+        logger.exception('Flushing %s offer views failed, retrying with the next flush', sum(pending.values()))
+        with _lock:
+            for pk, count in pending.items():
+                _pending[pk] = _pending.get(pk, 0) + count
+            _schedule_flush()
+        return 0
+    offer_cache.bump_version(VERSION_KEY)
+    return len(pending)
+
+
+def get_version():
+    """Shared version of the popularity ranking, changes with every flush of any process"""
+    return offer_cache.get_version(VERSION_KEY)
+
+
+def pending_views():
+    with _lock:
+        return dict(_pending)
@@ -0,0 +1,88 @@
+"""Full-text search over offer title/description backed by an SQLite FTS5 index."""
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'offers_fts'
+
+_available = {}
+
+
+def fts_available():
+    """Return True if the FTS5 index table exists on the default database"""
+    if connection.vendor != 'sqlite':
+        return False
+    if connection.alias not in _available:
+        if FTS_TABLE not in connection.introspection.table_names():
+            # Not cached: the table may still be created by a migrate run in another process
+            return False
+        _available[connection.alias] = True
+    return True
+
+
+def build_match_query(terms):
+    """Turn free-text search terms into an FTS5 query: every word is a prefix match, all words must match"""
+    words = []
+    for term in terms:
+        words.extend(re.findall(r'\w+', term))
+    return ' AND '.join(f'"{word}"*' for word in words)
+
+
+def search_offers(queryset, terms):
+    """Restrict an Offer queryset to index matches and annotate it with the bm25 search_rank (lower is better)"""
+    match = build_match_query(terms)
+    if not match:
+        return queryset
+    table = queryset.model._meta.db_table
+    matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,))
+    rank = RawSQL(
+        f'SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+        (match,)
+    )
+    return queryset.filter(pk__in=matches).annotate(search_rank=rank)
+
+
+def index_offer(offer):
+    """Insert or replace the index entry of one offer"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [offer.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)',
+            [offer.pk, offer.title, offer.description]
+        )
+
+
+def index_offers(offers):
+    """Add index entries for freshly inserted offers in one batch"""
+    if not fts_available() or not offers:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)',
+            [(offer.pk, offer.title, offer.description) for offer in offers]
+        )
+
+
+def unindex_offer(offer_id):
+    """Remove the index entry of one offer"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [offer_id])
+
+
+def rebuild_index():
+    """Rebuild the whole index from the offers table, returns the number of indexed offers"""
+    if not fts_available():
+        return 0
+    from .models import Offer
+    table = Offer._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) SELECT id, title, description FROM "{table}"'
+        )
+        return cursor.rowcount
@@ -0,0 +1,116 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from profiles_app.models import User
+from .models import Offer, OfferDetail, Tag
+from . import cache, cards, detail_cache, features, images, search, tags
+
+
+@receiver(post_save, sender=Offer)
+def index_offer_on_save(sender, instance, update_fields=None, **kwargs):
+    """Keep the full-text index in sync when title or description may have changed"""
+    if update_fields is not None and not {'title', 'description'} & set(update_fields):
+        return
+    search.index_offer(instance)
+
+
+@receiver(post_delete, sender=Offer)
+def unindex_offer_on_delete(sender, instance, **kwargs):
+    search.unindex_offer(instance.pk)
+
+
+@receiver(post_save, sender=Offer)
+def render_image_variants_on_save(sender, instance, update_fields=None, **kwargs):
+    """Re-render the image variants whenever the offer's image was replaced or removed"""
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if images.needs_render(instance):
+        images.schedule_render(instance.pk)
+
+
+@receiver(post_delete, sender=Offer)
+def delete_image_variants_on_delete(sender, instance, **kwargs):
+    variants = instance.image_variants
+    transaction.on_commit(lambda: images.delete_variant_files(variants))
+
+
+@receiver(post_save, sender=OfferDetail)
+def sync_feature_index_on_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is None or 'features' in update_fields:
+        features.sync_features([instance], created=created)
+
+
+@receiver(post_save, sender=OfferDetail)
+@receiver(post_delete, sender=OfferDetail)
+def invalidate_detail_cache_on_change(sender, instance, **kwargs):
+    detail_cache.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Offer)
+@receiver(post_delete, sender=Offer)
+@receiver(post_save, sender=OfferDetail)
+@receiver(post_delete, sender=OfferDetail)
+def invalidate_offer_lists_on_change(sender, **kwargs):
+    cache.invalidate_offer_lists()
+
+
+@receiver(post_save, sender=Offer)
+def refresh_card_on_offer_save(sender, instance, **kwargs):
+    cards.schedule_refresh([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def invalidate_offer_lists_on_user_change(sender, instance, created, update_fields=None, **kwargs):
+    """Offer lists embed the creator's names, so renaming a business user invalidates them"""
+    if created or instance.user_type != 'business':
+        return
+    if update_fields is not None and not {'first_name', 'last_name', 'username'} & set(update_fields):
+        return
+    cards.invalidate_cards(business_user=instance)
+    cache.invalidate_offer_lists()
+
+
+@receiver(m2m_changed, sender=Offer.tags.through)
+def update_tag_counts_on_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Adjust Tag.offer_count by the links actually added or removed, from either side of the relation"""
+    if action in ('pre_remove', 'pre_clear'):
+        instance._removed_tag_links = tags.links_for_change(instance, reverse, pk_set if action == 'pre_remove' else None)
+        return
+    if action == 'post_add':
+        links = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+        sign = 1
+    elif action in ('post_remove', 'post_clear'):
+        links = instance.__dict__.pop('_removed_tag_links', [])
+        sign = -1
+    else:
+        return
+    if not links:
+        return
+    tags.adjust_counts({tag_id: sign * count for tag_id, count in Counter(tag_id for _, tag_id in links).items()})
+    tags.touch_offers({offer_id for offer_id, _ in links})
+
+
+@receiver(pre_delete, sender=Offer)
+def release_tag_counts_on_delete(sender, instance, **kwargs):
+    """The offer's links are removed by cascade, which sends no m2m_changed"""
+    tag_ids = tags.OfferTag.objects.filter(offer_id=instance.pk).values_list('tag_id', flat=True)
+    tags.adjust_counts({tag_id: -1 for tag_id in tag_ids})
+
+
+@receiver(post_save, sender=Tag)
+def invalidate_cards_on_tag_change(sender, instance, created, **kwargs):
+    """Cards and lists show tag slugs"""
+    if created:
+        return
+    cards.invalidate_cards(tags=instance)
+    cache.invalidate_offer_lists()
+
+
+@receiver(pre_delete, sender=Tag)
+def invalidate_cards_on_tag_delete(sender, instance, **kwargs):
+    """The tag's links are removed by cascade, which sends no m2m_changed; invalidate while they still exist"""
+    cards.invalidate_cards(tags=instance)
+    cache.invalidate_offer_lists()
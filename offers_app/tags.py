@@ -0,0 +1,71 @@
+"""Offer tags and their stored offer counts."""
+from collections import Counter
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import cards
+from .cache import invalidate_offer_lists
+from .models import Offer, Tag
+
+OfferTag = Offer.tags.through
+
+
+def tag_slugs(values):
+    """Distinct slugs of the given tag names or slugs, in their original order"""
+    slugs = []
+    for value in values or []:
+        slug = slugify(str(value))
+        if slug and slug not in slugs:
+            slugs.append(slug)
+    return slugs
+
+
+def adjust_counts(deltas):
+    """Apply {tag_id: delta} to Tag.offer_count with one UPDATE per distinct delta"""
+    by_delta = {}
+    for tag_id, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(tag_id)
+    for delta, tag_ids in by_delta.items():
+        Tag.objects.filter(pk__in=tag_ids).update(offer_count=F('offer_count') + delta)
+
+
+def touch_offers(offer_ids):
+    """Tags are part of the offer representation: mark the offers as changed"""
+    Offer.objects.filter(pk__in=offer_ids).update(updated_at=timezone.now())
+    cards.schedule_refresh(offer_ids)
+    invalidate_offer_lists()
+
+
+def add_links(links):
+    """Insert (offer_id, tag_id) pairs in one batch and count them, for writers that bypass m2m_changed"""
+    links = set(links)
+    if not links:
+        return
+    OfferTag.objects.bulk_create([OfferTag(offer_id=offer_id, tag_id=tag_id) for offer_id, tag_id in links])
+    adjust_counts(Counter(tag_id for _, tag_id in links))
+
+
+def links_for_change(instance, reverse, pk_set):
+    """Existing (offer_id, tag_id) links an m2m change on instance would touch (pk_set None = all)"""
+    if reverse:
+        links = OfferTag.objects.filter(tag_id=instance.pk)
+        if pk_set is not None:
+            links = links.filter(offer_id__in=pk_set)
+    else:
+        links = OfferTag.objects.filter(offer_id=instance.pk)
+        if pk_set is not None:
+            links = links.filter(tag_id__in=pk_set)
+    return list(links.values_list('offer_id', 'tag_id'))
+
+
+def recount():
+    """Recompute every Tag.offer_count from the link table, returns the number of tags fixed"""
+    counts = OfferTag.objects.filter(tag_id=OuterRef('pk')).order_by().values('tag_id').annotate(
+        value=Count('pk')
+    ).values('value')
+    drifted = Tag.objects.exclude(offer_count=Coalesce(Subquery(counts), 0))
+    return drifted.update(offer_count=Coalesce(Subquery(counts), 0))
@@ -1,12 +1,50 @@
+import gzip
+import math
+import os
+import json
+import shutil
+import time
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 from django.urls import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APIRequestFactory, APITestCase, APITransactionTestCase
 
 
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
-from offers_app.models import Offer
+from django.contrib.auth.models import Permission
+from offers_app.models import Offer, OfferDetail, OfferFeature, Tag
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import F
+from datetime import timedelta
+from django.utils import timezone
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from unittest import skipUnless
+from PIL import Image
+from offers_app import cache as offer_cache, cards, detail_cache, exporter, images, popularity, search, tags
+from offers_app.models import CacheVersion
+from offers_app.api.serializers import OfferListSerializer, OfferSerializer
+from offers_app.importer import import_offers
+from core.testing import full_table_scans
+
+# A cache every worker process sees, unlike the default LocMem cache
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'coderr-test-cache'),
+    }
+}
 
 
 class OfferTests(APITestCase):
@@ -91,3 +129,1254 @@ class OfferTests(APITestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTrue(any('Web' in offer['title'] or 'Web' in offer['description'] for offer in response.data['results']))
 
+
+class OfferMinValuesTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        self.client.force_authenticate(user=self.business)
+
+    def create_offer(self):
+        data = {
+            'title': 'Grafikdesign',
+            'description': 'Logos und mehr',
+            'details': [
+                {'title': 'Basic', 'revisions': 1, 'delivery_time_in_days': 7, 'price': 100, 'features': ['A'], 'offer_type': 'basic'},
+                {'title': 'Standard', 'revisions': 2, 'delivery_time_in_days': 5, 'price': 200, 'features': ['B'], 'offer_type': 'standard'},
+                {'title': 'Premium', 'revisions': 3, 'delivery_time_in_days': 3, 'price': 300, 'features': ['C'], 'offer_type': 'premium'},
+            ]
+        }
+        response = self.client.post(reverse('offer-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Offer.objects.get(pk=response.data['id'])
+
+    def test_create_stores_min_values(self):
+        offer = self.create_offer()
+        self.assertEqual(offer.min_price, 100)
+        self.assertEqual(offer.min_delivery_time, 3)
+
+    def test_patch_details_recomputes_min_values(self):
+        offer = self.create_offer()
+        url = reverse('offer-detail', args=[offer.id])
+        data = {'details': [{'title': 'Basic', 'revisions': 1, 'delivery_time_in_days': 1, 'price': 50, 'features': [], 'offer_type': 'basic'}]}
+        response = self.client.patch(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        offer.refresh_from_db()
+        self.assertEqual(offer.min_price, 50)
+        self.assertEqual(offer.min_delivery_time, 1)
+
+    def test_delete_detail_recomputes_min_values(self):
+        offer = self.create_offer()
+        offer.details.get(offer_type='basic').delete()
+        offer.refresh_from_db()
+        self.assertEqual(offer.min_price, 200)
+        self.assertEqual(offer.min_delivery_time, 3)
+
+    def test_list_reads_stored_columns(self):
+        offer = self.create_offer()
+        Offer.objects.filter(pk=offer.pk).update(min_price=42)
+        response = self.client.get(reverse('offer-list'), {'min_price': 40, 'ordering': 'min_price'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['min_price'], 42)
+
+
+class OfferQueryCountTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        offers = Offer.objects.bulk_create([
+            Offer(business_user=cls.business, title=f'Angebot {i}', description='desc', min_price=100, min_delivery_time=3)
+            for i in range(100)
+        ])
+        OfferDetail.objects.bulk_create([
+            OfferDetail(offer=offer, title=offer_type, delivery_time_in_days=3 + n, price=100 * (n + 1), offer_type=offer_type)
+            for offer in offers
+            for n, offer_type in enumerate(['basic', 'standard', 'premium'])
+        ])
+        cls.offer = offers[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_offer_list_query_count_is_constant(self):
+        for page_size in [1, 10, 100]:
+            # Stale cards: list version, count, page, then the offers with their details and tags, rendered in memory
+            with self.assertNumQueries(6):
+                response = self.client.get(reverse('offer-list'), {'page_size': page_size})
+            self.assertEqual(len(response.data['results']), page_size)
+            cache.clear()
+        cards.refresh_cards(Offer.objects.values_list('pk', flat=True))
+        for page_size in [1, 10, 100]:
+            with self.assertNumQueries(3):
+                response = self.client.get(reverse('offer-list'), {'page_size': page_size})
+            self.assertEqual(len(response.data['results']), page_size)
+            cache.clear()
+
+    def test_my_offers_query_count_is_constant(self):
+        self.client.force_authenticate(user=self.business)
+        for page_size in [1, 10, 100]:
+            with self.assertNumQueries(5):
+                response = self.client.get(reverse('offer-my-offers'), {'page_size': page_size})
+            self.assertEqual(len(response.data['results']), page_size)
+
+    def test_offer_retrieve_query_count(self):
+        self.client.force_authenticate(user=self.business)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('offer-detail', args=[self.offer.id]))
+        self.assertEqual(len(response.data['details']), 3)
+
+    def test_offer_list_cursor_mode_walks_all_offers_without_count(self):
+        seen = []
+        url = reverse('offer-list')
+        params = {'cursor': '', 'page_size': 30}
+        cards.refresh_cards(Offer.objects.values_list('pk', flat=True))
+        while url:
+            with self.assertNumQueries(2):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(set(response.data.keys()), {'next', 'previous', 'results'})
+            seen.extend(offer['id'] for offer in response.data['results'])
+            url, params = response.data['next'], None
+        self.assertEqual(len(seen), 100)
+        self.assertEqual(len(set(seen)), 100)
+
+    def test_offer_list_defaults_to_page_number_shape(self):
+        response = self.client.get(reverse('offer-list'))
+        self.assertEqual(set(response.data.keys()), {'count', 'next', 'previous', 'results'})
+
+
+class OfferSearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        cls.web = cls.create_offer('Webdesign', 'Moderne Webseiten mit Logo')
+        cls.logo = cls.create_offer('Logo Design', 'Logos für Firmen')
+        cls.text = cls.create_offer('Texte', 'Werbetexte für Webseiten')
+
+    @classmethod
+    def create_offer(cls, title, description):
+        offer = Offer.objects.create(business_user=cls.business, title=title, description=description)
+        offer.details.create(title='Basic', delivery_time_in_days=3, price=100, offer_type='basic')
+        return offer
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, term, **params):
+        response = self.client.get(reverse('offer-list'), {'search': term, 'page_size': 10, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [offer['id'] for offer in response.data['results']]
+
+    def test_search_matches_prefixes(self):
+        self.assertEqual(set(self.search('Web')), {self.web.id, self.text.id})
+
+    def test_search_requires_all_terms(self):
+        self.assertEqual(self.search('logo web'), [self.web.id])
+
+    def test_search_ranks_title_and_description_matches_first(self):
+        self.assertEqual(self.search('logo')[0], self.logo.id)
+
+    def test_search_respects_explicit_ordering(self):
+        self.assertEqual(self.search('Web', ordering='title'), [self.text.id, self.web.id])
+
+    def test_missing_index_table_is_checked_again(self):
+        search._available.clear()
+        with mock.patch.object(connection.introspection, 'table_names', return_value=[]):
+            self.assertFalse(search.fts_available())
+        self.assertTrue(search.fts_available())
+
+    def test_search_index_follows_updates_and_deletes(self):
+        self.logo.title = 'Illustration'
+        self.logo.description = 'Zeichnungen'
+        self.logo.save()
+        self.assertEqual(self.search('logo'), [self.web.id])
+        self.assertEqual(self.search('zeichnung'), [self.logo.id])
+        self.logo.delete()
+        self.assertEqual(self.search('zeichnung'), [])
+
+
+class OfferListCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        cls.admin = User.objects.create_user(username='admin', password='testpass', is_staff=True)
+        cls.offer = Offer.objects.create(business_user=cls.business, title='Webdesign', description='Webseiten')
+        cls.detail = cls.offer.details.create(title='Basic', delivery_time_in_days=5, price=100, offer_type='basic')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_list_is_served_from_cache(self):
+        url = reverse('offer-list')
+        first = self.client.get(url, {'ordering': 'min_price', 'creator_id': self.business.id})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        # Only the list version is read
+        with self.assertNumQueries(1):
+            second = self.client.get(url, {'creator_id': self.business.id, 'ordering': 'min_price', 'page': ''})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.data, second.data)
+
+    def test_invalidation_by_another_worker_is_seen(self):
+        url = reverse('offer-list')
+        self.client.get(url)
+        Offer.objects.filter(pk=self.offer.pk).update(title='Anderswo', updated_at=timezone.now())
+        # What the signal of another worker leaves behind with a per-process cache: only the stored version changes
+        CacheVersion.objects.filter(pk=offer_cache.VERSION_KEY).update(value=F('value') + 1)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['title'], 'Anderswo')
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_shared_cache_serves_list_without_queries(self):
+        cache.clear()
+        url = reverse('offer-list')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        self.offer.title = 'Neu'
+        self.offer.save()
+        self.assertEqual(self.client.get(url).data['results'][0]['title'], 'Neu')
+
+    def test_detail_change_invalidates_cached_lists(self):
+        url = reverse('offer-list')
+        self.client.get(url)
+        self.detail.price = 80
+        self.detail.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['min_price'], 80)
+
+    def test_offer_delete_invalidates_cached_lists(self):
+        url = reverse('offer-list')
+        self.assertEqual(self.client.get(url).data['count'], 1)
+        self.offer.delete()
+        self.assertEqual(self.client.get(url).data['count'], 0)
+
+    def test_authenticated_list_is_not_cached(self):
+        self.client.force_authenticate(user=self.business)
+        self.client.get(reverse('offer-list'))
+        response = self.client.get(reverse('offer-list'))
+        self.assertNotIn('X-Cache', response)
+
+    def test_cache_stats_counts_hits_and_misses(self):
+        url = reverse('offer-list')
+        self.client.get(url)
+        self.client.get(url)
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('offer-cache-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['hits'], 1)
+        self.assertEqual(response.data['misses'], 1)
+
+    def test_cache_stats_requires_admin(self):
+        self.client.force_authenticate(user=self.business)
+        response = self.client.get(reverse('offer-cache-stats'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class OfferBulkImportTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        self.customer = User.objects.create_user(username='kunde', password='testpass', user_type='customer')
+
+    def record(self, title, price=100):
+        return {
+            'title': title,
+            'description': f'{title} Beschreibung',
+            'details': [
+                {'title': 'Basic', 'revisions': 1, 'delivery_time_in_days': 7, 'price': price, 'features': ['A'], 'offer_type': 'basic'},
+                {'title': 'Standard', 'revisions': 2, 'delivery_time_in_days': 5, 'price': price * 2, 'features': ['B'], 'offer_type': 'standard'},
+                {'title': 'Premium', 'revisions': 3, 'delivery_time_in_days': 3, 'price': price * 3, 'features': ['C'], 'offer_type': 'premium'},
+            ]
+        }
+
+    def test_bulk_import_reports_invalid_records_and_keeps_valid_ones(self):
+        self.client.force_authenticate(user=self.business)
+        invalid = self.record('Kaputt')
+        invalid['details'] = invalid['details'][:1]
+        records = [self.record('Webdesign'), invalid, self.record('Logo', price=50)]
+        response = self.client.post(reverse('offer-bulk-import'), records, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+        offer = Offer.objects.get(title='Logo')
+        self.assertEqual(offer.business_user, self.business)
+        self.assertEqual(offer.details.count(), 3)
+        self.assertEqual(offer.min_price, 50)
+        self.assertEqual(offer.min_delivery_time, 3)
+
+    def test_bulk_import_uses_batched_inserts(self):
+        records = [self.record(f'Angebot {i}') for i in range(20)]
+        offer_cache.invalidate_offer_lists()
+        # savepoint + offers INSERT + details INSERT + feature index INSERT + search index + list version + release
+        with self.assertNumQueries(7):
+            report = import_offers(records, self.business, chunk_size=20)
+        self.assertEqual(report['created'], 20)
+        self.assertEqual(OfferDetail.objects.count(), 60)
+
+    def test_bulk_import_requires_business_user(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.post(reverse('offer-bulk-import'), [self.record('Webdesign')], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_offers_command_reads_ndjson(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False, encoding='utf-8') as handle:
+            handle.write(json.dumps(self.record('Webdesign')) + '\n')
+            handle.write('{kein json}\n')
+            handle.write(json.dumps(self.record('Logo')) + '\n')
+        call_command('import_offers', handle.name, user='biz', stdout=open(os.devnull, 'w'), stderr=open(os.devnull, 'w'))
+        os.remove(handle.name)
+        self.assertEqual(set(Offer.objects.values_list('title', flat=True)), {'Webdesign', 'Logo'})
+
+
+class OfferUpdateDiffTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        self.client.force_authenticate(user=self.business)
+        self.offer = Offer.objects.create(business_user=self.business, title='Webdesign', description='Webseiten')
+        for n, offer_type in enumerate(['basic', 'standard', 'premium']):
+            self.offer.details.create(
+                title=offer_type, revisions=n, delivery_time_in_days=10 - n, price=100 * (n + 1),
+                features=['A'], offer_type=offer_type
+            )
+        self.url = reverse('offer-detail', args=[self.offer.id])
+
+    def detail_data(self, offer_type, price):
+        detail = self.offer.details.get(offer_type=offer_type)
+        return {
+            'title': detail.title, 'revisions': detail.revisions, 'delivery_time_in_days': detail.delivery_time_in_days,
+            'price': price, 'features': detail.features, 'offer_type': offer_type
+        }
+
+    def patch_and_capture(self, data):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query['sql'] for query in context.captured_queries]
+
+    def test_patch_statement_count_does_not_depend_on_tier_count(self):
+        one = self.patch_and_capture({'details': [self.detail_data('basic', 90)]})
+        three = self.patch_and_capture({'details': [
+            self.detail_data('basic', 80), self.detail_data('standard', 180), self.detail_data('premium', 280)
+        ]})
+        self.assertEqual(len(one), len(three))
+        self.assertEqual(
+            sorted(self.offer.details.values_list('price', flat=True)), [80, 180, 280]
+        )
+
+    def test_patch_writes_only_changed_fields(self):
+        queries = self.patch_and_capture({'details': [self.detail_data('basic', 90)]})
+        detail_updates = [sql for sql in queries if sql.startswith('UPDATE "offer_details"')]
+        self.assertEqual(len(detail_updates), 1)
+        self.assertIn('"price"', detail_updates[0])
+        self.assertNotIn('"title"', detail_updates[0])
+        offer_updates = [sql for sql in queries if sql.startswith('UPDATE "offers" SET "title"')]
+        self.assertEqual(offer_updates, [])
+
+    def test_patch_without_changes_does_not_write(self):
+        queries = self.patch_and_capture({'title': 'Webdesign', 'details': [self.detail_data('basic', 100)]})
+        self.assertFalse([sql for sql in queries if sql.startswith(('UPDATE', 'INSERT', 'DELETE'))])
+
+    def test_offer_serializer_update_deletes_missing_details(self):
+        serializer = OfferSerializer(self.offer, data={
+            'title': 'Webdesign', 'description': 'Webseiten',
+            'details': [self.detail_data('basic', 50), self.detail_data('standard', 60), self.detail_data('premium', 70)]
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertEqual(sorted(self.offer.details.values_list('price', flat=True)), [50, 60, 70])
+        self.offer.refresh_from_db()
+        self.assertEqual(self.offer.min_price, 50)
+
+
+class OfferWriteResponseTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        self.client.force_authenticate(user=self.business)
+        self.data = {
+            'title': 'Grafikdesign',
+            'description': 'Logos und mehr',
+            'details': [
+                {'title': 'Premium', 'revisions': 3, 'delivery_time_in_days': 3, 'price': 300, 'features': ['C'], 'offer_type': 'premium'},
+                {'title': 'Basic', 'revisions': 1, 'delivery_time_in_days': 7, 'price': 99.5, 'features': ['A'], 'offer_type': 'basic'},
+                {'title': 'Standard', 'revisions': 2, 'delivery_time_in_days': 5, 'price': 200, 'features': [], 'offer_type': 'standard'},
+            ]
+        }
+
+    def legacy_response(self, offer_id):
+        """The body the views used to build by re-reading the details"""
+        offer = Offer.objects.get(pk=offer_id)
+        def price_as_int_or_float(val):
+            return int(val) if float(val).is_integer() else float(val)
+        details_list = [
+            {
+                'id': d.id,
+                'title': d.title,
+                'revisions': d.revisions,
+                'delivery_time_in_days': d.delivery_time_in_days,
+                'price': price_as_int_or_float(d.price),
+                'features': d.features,
+                'offer_type': d.offer_type
+            }
+            for d in offer.details.all()
+        ]
+        data = {
+            'id': offer.id,
+            'title': offer.title,
+            'image': offer.image.url if offer.image else None,
+            'description': offer.description,
+            'details': details_list
+        }
+        return JSONRenderer().render(data)
+
+    def test_create_response_matches_legacy_output_without_rereading(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('offer-list'), self.data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse([q for q in context.captured_queries if q['sql'].startswith('SELECT')])
+        self.assertEqual(response.content, self.legacy_response(response.data['id']))
+
+    def test_patch_and_put_responses_match_legacy_output(self):
+        offer_id = self.client.post(reverse('offer-list'), self.data, format='json').data['id']
+        url = reverse('offer-detail', args=[offer_id])
+        patch = self.client.patch(url, {'title': 'Neu', 'details': [{**self.data['details'][2], 'price': 150.25}]}, format='json')
+        self.assertEqual(patch.status_code, status.HTTP_200_OK)
+        self.assertEqual(patch.content, self.legacy_response(offer_id))
+        patch = self.client.patch(url, {'description': 'Nur Text'}, format='json')
+        self.assertEqual(patch.content, self.legacy_response(offer_id))
+        put = self.client.put(url, {**self.data, 'title': 'Ersetzt'}, format='json')
+        self.assertEqual(put.status_code, status.HTTP_200_OK)
+        self.assertEqual(put.content, self.legacy_response(offer_id))
+
+
+class OfferConditionalGetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        cls.offer = Offer.objects.create(business_user=cls.business, title='Webdesign', description='Webseiten')
+        cls.detail = cls.offer.details.create(title='Basic', delivery_time_in_days=5, price=100, offer_type='basic')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.business)
+
+    def test_offer_retrieve_answers_304_without_serializing(self):
+        url = reverse('offer-detail', args=[self.offer.id])
+        first = self.client.get(url)
+        self.assertIn('ETag', first)
+        self.assertIn('Last-Modified', first)
+        with self.assertNumQueries(1):
+            second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_detail_change_changes_offer_etag(self):
+        url = reverse('offer-detail', args=[self.offer.id])
+        etag = self.client.get(url)['ETag']
+        self.detail.price = 80
+        self.detail.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['min_price'], 80)
+
+    def test_offerdetail_retrieve_answers_304(self):
+        url = reverse('offerdetail-detail', args=[self.detail.id])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_answers_304_from_the_list_version_until_an_offer_changes(self):
+        self.client.force_authenticate(user=None)
+        url = reverse('offer-list')
+        etag = self.client.get(url, {'ordering': 'min_price'})['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'ordering': 'min_price'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+        self.offer.title = 'Neu'
+        self.offer.save()
+        self.assertEqual(
+            self.client.get(url, {'ordering': 'min_price'}, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_200_OK
+        )
+
+    def test_renaming_business_user_changes_list_etag(self):
+        url = reverse('offer-list')
+        etag = self.client.get(url)['ETag']
+        self.business.first_name = 'Lisa'
+        self.business.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['user_details']['first_name'], 'Lisa')
+
+    def test_my_offers_etag_is_per_user(self):
+        url = reverse('offer-my-offers')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        other = get_user_model().objects.create_user(username='biz2', password='testpass', user_type='business')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+
+@override_settings(OFFER_IMAGE_WORKERS=0)
+class OfferImageVariantTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        cache.clear()
+        User = get_user_model()
+        self.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        self.client.force_authenticate(user=self.business)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, size=(2400, 1800)):
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Kamera'
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('foto.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def create_offer(self):
+        offer = Offer.objects.create(business_user=self.business, title='Fotografie', description='Bilder', image=self.upload())
+        offer.details.create(title='Basic', delivery_time_in_days=5, price=100, offer_type='basic')
+        return offer
+
+    def test_upload_renders_resized_variants_without_metadata(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            offer = self.create_offer()
+        offer.refresh_from_db()
+        self.assertEqual(offer.image_variants['source'], offer.image.name)
+        for name, box in images.VARIANTS.items():
+            with default_storage.open(offer.image_variants[name]) as f:
+                variant = Image.open(f)
+                self.assertLessEqual(variant.width, box[0])
+                self.assertLessEqual(variant.height, box[1])
+                self.assertEqual(len(variant.getexif()), 0)
+
+    def test_list_exposes_variant_urls(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            offer = self.create_offer()
+        response = self.client.get(reverse('offer-list'))
+        variants = response.data['results'][0]['image_variants']
+        self.assertTrue(variants['card'].startswith('http://testserver/media/offers/variants/'))
+        offer.refresh_from_db()
+        self.assertTrue(variants['card'].endswith(offer.image_variants['card']))
+
+    def test_variants_are_null_until_rendered(self):
+        offer = self.create_offer()
+        response = self.client.get(reverse('offer-detail', args=[offer.id]))
+        self.assertEqual(response.data['image_variants'], {'thumbnail': None, 'card': None, 'full': None})
+
+    def test_replacing_image_renders_new_variants_and_removes_old_files(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            offer = self.create_offer()
+        offer.refresh_from_db()
+        old_card = offer.image_variants['card']
+        with self.captureOnCommitCallbacks(execute=True):
+            offer.image = self.upload((300, 200))
+            offer.save(update_fields=['image', 'updated_at'])
+        offer.refresh_from_db()
+        self.assertNotEqual(offer.image_variants['card'], old_card)
+        self.assertFalse(default_storage.exists(old_card))
+        self.assertTrue(default_storage.exists(offer.image_variants['card']))
+
+    def test_saving_other_fields_does_not_rerender(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            offer = self.create_offer()
+        offer.refresh_from_db()
+        with mock.patch('offers_app.images.render_variants') as render:
+            with self.captureOnCommitCallbacks(execute=True):
+                offer.title = 'Neu'
+                offer.save(update_fields=['title', 'updated_at'])
+                offer.save()
+        render.assert_not_called()
+
+
+class OfferFacetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        cls.other = User.objects.create_user(username='biz2', password='testpass', user_type='business')
+        for user, title, price, days, offer_type in [
+            (cls.business, 'Logo', 40, 2, 'basic'),
+            (cls.business, 'Webseite', 120, 10, 'standard'),
+            (cls.business, 'Shop', 1500, 45, 'premium'),
+            (cls.other, 'Flyer', 60, 3, 'basic'),
+        ]:
+            offer = Offer.objects.create(business_user=user, title=title, description='Design')
+            offer.details.create(title='Paket', delivery_time_in_days=days, price=price, offer_type=offer_type)
+            if offer_type != 'basic':
+                offer.details.create(title='Extra', delivery_time_in_days=days + 1, price=price + 10, offer_type='basic')
+
+    def setUp(self):
+        cache.clear()
+
+    def bucket_counts(self, facet):
+        return [bucket['count'] for bucket in facet['buckets']]
+
+    def test_facets_count_offers_per_bucket(self):
+        response = self.client.get(reverse('offer-facets'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(response.data['price']['min'], 40)
+        self.assertEqual(response.data['price']['max'], 1500)
+        self.assertEqual(self.bucket_counts(response.data['price']), [1, 1, 1, 0, 0, 1])
+        self.assertEqual(self.bucket_counts(response.data['delivery_time']), [1, 1, 1, 0, 1])
+        self.assertEqual(response.data['offer_type'], [
+            {'value': 'basic', 'count': 4}, {'value': 'standard', 'count': 1}, {'value': 'premium', 'count': 1}
+        ])
+
+    def test_facets_apply_list_filters(self):
+        response = self.client.get(reverse('offer-facets'), {'creator_id': self.business.id, 'max_delivery_time': 10})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(self.bucket_counts(response.data['price']), [1, 0, 1, 0, 0, 0])
+
+    def test_facets_use_two_queries_and_are_cached(self):
+        url = reverse('offer-facets')
+        # The list version, then the two facet queries on a miss only
+        with self.assertNumQueries(3):
+            first = self.client.get(url, {'min_price': 50})
+        with self.assertNumQueries(1):
+            second = self.client.get(url, {'min_price': 50})
+        self.assertEqual(first.data, second.data)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'min_price': 50}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_facets_follow_offer_changes(self):
+        url = reverse('offer-facets')
+        self.assertEqual(self.client.get(url).data['count'], 4)
+        Offer.objects.get(title='Logo').delete()
+        self.assertEqual(self.client.get(url).data['count'], 3)
+
+
+class OfferDetailFilterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        cls.basic_only = Offer.objects.create(business_user=cls.business, title='Logo', description='Design')
+        cls.basic_only.details.create(title='Basic', delivery_time_in_days=5, price=50, offer_type='basic')
+        cls.full = Offer.objects.create(business_user=cls.business, title='Shop', description='Design')
+        for offer_type, days in [('basic', 10), ('standard', 7), ('premium', 2)]:
+            cls.full.details.create(title=offer_type, delivery_time_in_days=days, price=100, offer_type=offer_type)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_offer_type_filter_uses_exists_without_join(self):
+        url = reverse('offer-list')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'offer_type': 'premium', 'page_size': 10})
+        self.assertEqual([o['id'] for o in response.data['results']], [self.full.id])
+        select = next(q['sql'] for q in context.captured_queries if 'EXISTS' in q['sql'])
+        self.assertNotIn('JOIN "offer_details"', select)
+        response = self.client.get(url, {'offer_type': 'basic', 'page_size': 10})
+        self.assertEqual(response.data['count'], 2)
+
+    def test_max_delivery_time_matches_any_detail(self):
+        response = self.client.get(reverse('offer-list'), {'max_delivery_time': 3, 'page_size': 10})
+        self.assertEqual([o['id'] for o in response.data['results']], [self.full.id])
+
+    def test_benchmark_command_runs_and_rolls_back(self):
+        out = StringIO()
+        call_command('benchmark_offer_filters', offers=30, repeat=1, stdout=out)
+        for name in ['join', 'exists', 'column']:
+            self.assertIn(name, out.getvalue())
+        self.assertEqual(Offer.objects.count(), 2)
+
+
+class OfferQueryPlanTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        for i in range(3):
+            offer = Offer.objects.create(business_user=cls.business, title=f'Angebot {i}', description='Design')
+            offer.details.create(title='Basic', delivery_time_in_days=5 + i, price=100 + i, offer_type='basic')
+            offer.details.create(title='Premium', delivery_time_in_days=2, price=300, offer_type='premium')
+        Offer.objects.create(business_user=cls.business, title='Entwurf', description='ohne Details', is_active=False)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.business)
+
+    def assertNoFullScans(self, *requests):
+        with CaptureQueriesContext(connection) as context:
+            for path, params in requests:
+                self.assertEqual(self.client.get(path, params).status_code, status.HTTP_200_OK)
+        self.assertEqual(full_table_scans(context.captured_queries), [])
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+    def test_hot_offer_queries_use_indexes(self):
+        offer = Offer.objects.filter(is_active=True).first()
+        self.assertNoFullScans(
+            (reverse('offer-list'), {}),
+            (reverse('offer-list'), {'page_size': 10, 'ordering': 'min_price'}),
+            (reverse('offer-list'), {'cursor': '', 'page_size': 10}),
+            (reverse('offer-list'), {'creator_id': self.business.id}),
+            (reverse('offer-my-offers'), {}),
+            (reverse('offer-detail', args=[offer.id]), {}),
+            (reverse('offerdetail-detail', args=[offer.details.first().id]), {}),
+        )
+
+
+class OfferDetailCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        detail_cache.clear()
+        User = get_user_model()
+        self.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        self.client.force_authenticate(user=self.business)
+        self.offer = Offer.objects.create(business_user=self.business, title='Webdesign', description='Webseiten')
+        self.basic = self.offer.details.create(title='Basic', delivery_time_in_days=5, price=100, offer_type='basic')
+        self.premium = self.offer.details.create(title='Premium', delivery_time_in_days=2, price=300, offer_type='premium')
+        self.url = reverse('offerdetail-detail', args=[self.basic.id])
+
+    def test_hot_detail_lookup_only_reads_the_version(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['title'], 'Basic')
+        with self.assertNumQueries(1):
+            detail = detail_cache.get_detail(self.basic.id)
+        self.assertEqual(detail.offer.business_user_id, self.business.id)
+
+    def test_save_and_delete_invalidate_entry(self):
+        self.client.get(self.url)
+        self.basic.title = 'Basis'
+        self.basic.save()
+        self.assertEqual(self.client.get(self.url).data['title'], 'Basis')
+        self.basic.delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_batched_offer_update_invalidates_entries(self):
+        self.client.get(self.url)
+        patch = {'details': [{'id': self.basic.id, 'offer_type': 'basic', 'price': 500}]}
+        self.client.patch(reverse('offer-detail', args=[self.offer.id]), patch, format='json')
+        self.assertEqual(self.client.get(self.url).data['price'], '500.00')
+
+    def test_version_bump_from_another_process_is_seen(self):
+        self.client.get(self.url)
+        OfferDetail.objects.filter(pk=self.basic.id).update(title='Anderswo')
+        # What the signal of another worker leaves behind: only the shared version changes
+        offer_cache.bump_version(detail_cache._version_key(self.basic.id))
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(self.url).data['title'], 'Anderswo')
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_shared_cache_lookup_skips_database(self):
+        cache.clear()
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).data['title'], 'Basic')
+        OfferDetail.objects.filter(pk=self.basic.id).update(title='Anderswo')
+        offer_cache.bump_version(detail_cache._version_key(self.basic.id))
+        self.assertEqual(self.client.get(self.url).data['title'], 'Anderswo')
+
+    @override_settings(OFFER_DETAIL_CACHE_SIZE=1)
+    def test_cache_is_bounded(self):
+        detail_cache.get_detail(self.basic.id)
+        detail_cache.get_detail(self.premium.id)
+        with self.assertNumQueries(2):
+            detail_cache.get_detail(self.basic.id)
+
+
+class OfferExportTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        cls.admin = User.objects.create_user(username='admin', password='testpass', is_staff=True)
+        for i in range(5):
+            offer = Offer.objects.create(business_user=cls.business, title=f'Angebot {i}', description='Design')
+            offer.details.create(title='Basic', delivery_time_in_days=5, price=99.5, offer_type='basic', features=['A'])
+            offer.details.create(title='Premium', delivery_time_in_days=2, price=300, offer_type='premium')
+        Offer.objects.filter(title='Angebot 4').update(is_active=False)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.admin)
+
+    def read_lines(self, response):
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_export_streams_one_line_per_offer(self):
+        response = self.client.get(reverse('offer-export'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = self.read_lines(response)
+        self.assertEqual([r['title'] for r in records], [f'Angebot {i}' for i in range(5)])
+        self.assertFalse(records[4]['is_active'])
+        self.assertEqual(records[0]['min_price'], 99.5)
+        self.assertEqual([d['offer_type'] for d in records[0]['details']], ['basic', 'premium'])
+        self.assertEqual(records[0]['user_details']['username'], 'biz')
+
+    def test_export_queries_do_not_grow_with_catalogue(self):
+        # one cursor over offers plus one details query per chunk of 2
+        with self.assertNumQueries(1 + 3):
+            lines = list(exporter.iter_lines(exporter.export_queryset(), chunk_size=2))
+        self.assertEqual(len(lines), 5)
+
+    def test_export_gzip_and_updated_since(self):
+        changed = Offer.objects.get(title='Angebot 2')
+        Offer.objects.exclude(pk=changed.pk).update(updated_at=timezone.now() - timedelta(days=3))
+        since = (timezone.now() - timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        response = self.client.get(reverse('offer-export'), {'updated_since': since}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual([json.loads(line)['id'] for line in body.splitlines()], [changed.id])
+
+    def test_export_honours_accept_encoding_quality(self):
+        for header in ['gzip;q=0', 'gzip; q=0.0, deflate', 'identity', '*;q=0', 'br, gzip;q=0']:
+            response = self.client.get(reverse('offer-export'), HTTP_ACCEPT_ENCODING=header)
+            self.assertFalse(response.has_header('Content-Encoding'), header)
+            self.assertEqual(len(self.read_lines(response)), 5)
+        for header in ['gzip;q=0.5', 'br;q=1.0, *;q=0.1', 'x-gzip']:
+            response = self.client.get(reverse('offer-export'), HTTP_ACCEPT_ENCODING=header)
+            self.assertEqual(response['Content-Encoding'], 'gzip', header)
+
+    def test_export_rejects_invalid_updated_since(self):
+        response = self.client.get(reverse('offer-export'), {'updated_since': 'gestern'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_requires_staff_or_export_permission(self):
+        self.client.force_authenticate(user=self.business)
+        self.assertEqual(self.client.get(reverse('offer-export')).status_code, status.HTTP_403_FORBIDDEN)
+        partner = get_user_model().objects.create_user(username='partner', password='testpass')
+        partner.user_permissions.add(Permission.objects.get(codename='export_offers'))
+        self.client.force_authenticate(user=partner)
+        self.assertEqual(self.client.get(reverse('offer-export')).status_code, status.HTTP_200_OK)
+
+    def test_export_offers_command_writes_gzip_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'offers.ndjson.gz')
+        call_command('export_offers', path, '--gzip', stderr=StringIO())
+        with gzip.open(path) as f:
+            self.assertEqual(len(f.read().splitlines()), 5)
+        shutil.rmtree(os.path.dirname(path))
+
+
+@override_settings(OFFER_IMAGE_WORKERS=0)
+class OfferCardTests(APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        cache.clear()
+        User = get_user_model()
+        self.business = User.objects.create_user(username='biz', password='testpass', user_type='business', first_name='Anna')
+        self.offer = Offer.objects.create(business_user=self.business, title='Logo', description='Logos')
+        self.detail = self.offer.details.create(title='Basic', delivery_time_in_days=5, price=100, offer_type='basic')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def list_results(self):
+        cache.clear()
+        return self.client.get(reverse('offer-list'), {'page_size': 10}).json()['results']
+
+    def serializer_results(self):
+        request = Request(APIRequestFactory().get('/api/offers/'))
+        offers = Offer.objects.filter(is_active=True).order_by('-updated_at', 'id')
+        return json.loads(json.dumps(OfferListSerializer(offers, many=True, context={'request': request}).data, cls=DjangoJSONEncoder))
+
+    def test_card_list_matches_serializer_output(self):
+        buffer = BytesIO()
+        Image.new('RGB', (2000, 1500), 'blue').save(buffer, 'JPEG')
+        with self.captureOnCommitCallbacks(execute=True):
+            offer = Offer.objects.create(
+                business_user=self.business, title='Foto', description='Bilder',
+                image=SimpleUploadedFile('foto.jpg', buffer.getvalue(), content_type='image/jpeg'),
+            )
+            offer.details.create(title='Basic', delivery_time_in_days=2, price=49.5, offer_type='basic')
+        results = self.list_results()
+        self.assertEqual(results, self.serializer_results())
+        self.assertTrue(results[0]['image'].startswith('http://testserver/media/'))
+        self.assertTrue(results[0]['image_variants']['card'].startswith('http://testserver/media/'))
+
+    def test_cards_are_stored_by_writes_and_lists_only_read(self):
+        with CaptureQueriesContext(connection) as context:
+            self.list_results()
+        self.assertFalse([q for q in context.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))])
+        self.offer.refresh_from_db()
+        self.assertIsNone(self.offer.card)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.detail.price = 80
+            self.detail.save()
+        self.offer.refresh_from_db()
+        self.assertTrue(cards.is_current(self.offer))
+        with self.assertNumQueries(3):
+            self.assertEqual(self.list_results()[0]['min_price'], 80)
+
+    def test_card_follows_detail_and_owner_changes(self):
+        self.list_results()
+        self.detail.price = 80
+        self.detail.save()
+        self.assertEqual(self.list_results()[0]['min_price'], 80)
+        self.business.first_name = 'Berta'
+        self.business.save(update_fields=['first_name'])
+        self.assertEqual(self.list_results()[0]['user_details']['first_name'], 'Berta')
+        self.assertEqual(self.list_results(), self.serializer_results())
+
+    def test_refresh_command_stores_stale_cards(self):
+        call_command('refresh_offer_cards', stdout=StringIO())
+        self.offer.refresh_from_db()
+        self.assertTrue(cards.is_current(self.offer))
+
+    def test_browsable_api_still_uses_serializer(self):
+        response = self.client.get(reverse('offer-list'), {'page_size': 10, 'format': 'api'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'Logo', response.content)
+
+
+@override_settings(OFFER_IMAGE_WORKERS=0)
+class OfferCardAutocommitTests(APITransactionTestCase):
+    """Writes outside an atomic block run their on_commit callbacks immediately"""
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+
+    def test_api_create_stores_current_card(self):
+        self.client.force_authenticate(user=self.business)
+        data = {
+            'title': 'Logo', 'description': 'Logos',
+            'details': [
+                {'title': t, 'revisions': 1, 'delivery_time_in_days': d, 'price': p, 'features': [], 'offer_type': t}
+                for t, d, p in [('basic', 5, 100), ('standard', 4, 200), ('premium', 3, 300)]
+            ],
+        }
+        response = self.client.post(reverse('offer-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        offer = Offer.objects.get(pk=response.data['id'])
+        self.assertTrue(cards.is_current(offer))
+        self.assertEqual(json.loads(bytes(offer.card))['min_price'], 100)
+
+    def test_detail_save_and_delete_store_current_card(self):
+        offer = Offer.objects.create(business_user=self.business, title='Logo', description='Logos')
+        detail = offer.details.create(title='Basic', delivery_time_in_days=5, price=100, offer_type='basic')
+        offer.refresh_from_db()
+        self.assertTrue(cards.is_current(offer))
+        detail.price = 80
+        detail.save()
+        offer.refresh_from_db()
+        self.assertTrue(cards.is_current(offer))
+        self.assertEqual(json.loads(bytes(offer.card))['min_price'], 80)
+        detail.delete()
+        offer.refresh_from_db()
+        self.assertTrue(cards.is_current(offer))
+        self.assertIsNone(json.loads(bytes(offer.card))['min_price'])
+
+
+@override_settings(OFFER_VIEW_FLUSH_HITS=1000, OFFER_VIEW_FLUSH_INTERVAL=3600)
+class OfferPopularityTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        popularity.flush()
+        User = get_user_model()
+        self.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        self.customer = User.objects.create_user(username='cust', password='testpass', user_type='customer')
+        self.offers = []
+        for title in ['Logo', 'Webseite', 'Texte']:
+            offer = Offer.objects.create(business_user=self.business, title=title, description='desc')
+            offer.details.create(title='Basic', delivery_time_in_days=3, price=100, offer_type='basic')
+            self.offers.append(offer)
+
+    def view(self, offer, times=1):
+        self.client.force_authenticate(user=self.customer)
+        for _ in range(times):
+            self.client.get(reverse('offer-detail', args=[offer.id]))
+
+    def test_views_are_buffered_and_flushed_in_one_update(self):
+        self.view(self.offers[0], 3)
+        self.view(self.offers[1], 2)
+        self.offers[0].refresh_from_db()
+        self.assertEqual(self.offers[0].view_count, 0)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(popularity.flush(), 2)
+        self.assertEqual(len([q for q in context.captured_queries if q['sql'].startswith('UPDATE "offers"')]), 1)
+        counts = dict(Offer.objects.values_list('title', 'view_count'))
+        self.assertEqual(counts, {'Logo': 3, 'Webseite': 2, 'Texte': 0})
+
+    def test_flush_after_hit_threshold(self):
+        with self.settings(OFFER_VIEW_FLUSH_HITS=2):
+            self.view(self.offers[2], 2)
+        self.offers[2].refresh_from_db()
+        self.assertEqual(self.offers[2].view_count, 2)
+        self.assertEqual(popularity.pending_views(), {})
+
+    def test_flush_does_not_touch_updated_at(self):
+        updated_at = Offer.objects.get(pk=self.offers[0].pk).updated_at
+        self.view(self.offers[0])
+        popularity.flush()
+        self.assertEqual(Offer.objects.get(pk=self.offers[0].pk).updated_at, updated_at)
+
+    def test_ordering_by_popularity(self):
+        self.view(self.offers[1], 3)
+        self.view(self.offers[2], 1)
+        popularity.flush()
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('offer-list'), {'ordering': '-popularity', 'page_size': 10})
+        self.assertEqual([offer['title'] for offer in response.data['results']], ['Webseite', 'Texte', 'Logo'])
+        self.view(self.offers[0], 5)
+        popularity.flush()
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('offer-list'), {'ordering': '-popularity', 'page_size': 10})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['title'], 'Logo')
+
+    def test_recent_views_outweigh_older_ones(self):
+        now = timezone.now()
+        self.assertAlmostEqual(popularity.view_score(now) - popularity.view_score(now - timedelta(days=7)), 1)
+        self.view(self.offers[0], 3)
+        popularity.flush()
+        with mock.patch('offers_app.popularity.timezone.now', return_value=now + timedelta(days=14)):
+            self.view(self.offers[1], 1)
+            popularity.flush()
+        scores = dict(Offer.objects.values_list('title', 'popularity'))
+        # Three views two half-lives ago weigh 3/4 of one view now
+        self.assertAlmostEqual(scores['Webseite'] - scores['Logo'], math.log2(4 / 3), places=6)
+
+    @override_settings(OFFER_POPULARITY_HALF_LIFE_DAYS=1)
+    def test_far_future_views_do_not_overflow(self):
+        future = timezone.now() + timedelta(days=365 * 200)
+        self.view(self.offers[0], 2)
+        popularity.flush()
+        with mock.patch('offers_app.popularity.timezone.now', return_value=future):
+            self.view(self.offers[1], 1)
+            self.assertEqual(popularity.flush(), 1)
+            self.view(self.offers[0], 1)
+            popularity.flush()
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('offer-list'), {'ordering': '-popularity', 'page_size': 10})
+        self.assertEqual([offer['title'] for offer in response.data['results']], ['Logo', 'Webseite', 'Texte'])
+
+
+@override_settings(OFFER_VIEW_FLUSH_HITS=1000, OFFER_VIEW_FLUSH_INTERVAL=0.1, OFFER_VIEW_FLUSH_TIMER=True)
+class OfferViewFlushWithoutTrafficTests(APITransactionTestCase):
+    """Buffered views must reach the database without waiting for another view"""
+    def setUp(self):
+        popularity.flush()
+        with popularity._lock:
+            if popularity._timer is not None:
+                popularity._timer.cancel()
+                popularity._timer = None
+        business = get_user_model().objects.create_user(username='biz', password='testpass', user_type='business')
+        self.offer = Offer.objects.create(business_user=business, title='Logo', description='desc')
+
+    def view_count(self):
+        return Offer.objects.values_list('view_count', flat=True).get(pk=self.offer.pk)
+
+    def test_idle_buffer_is_flushed_by_timer(self):
+        popularity.record_view(self.offer.pk)
+        for _ in range(50):
+            if self.view_count():
+                break
+            time.sleep(0.1)
+        self.assertEqual(self.view_count(), 1)
+        self.assertEqual(popularity.pending_views(), {})
+
+    def test_buffer_is_flushed_at_exit(self):
+        with self.settings(OFFER_VIEW_FLUSH_INTERVAL=3600):
+            popularity.record_view(self.offer.pk)
+            with mock.patch.object(popularity, '_database', 'other.sqlite3'):
+                popularity._flush_at_exit()
+            self.assertEqual(self.view_count(), 0)
+            popularity._flush_at_exit()
+        self.assertEqual(self.view_count(), 1)
+
+
+class OfferFeatureFilterTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        self.client.force_authenticate(user=self.business)
+        self.logo = self.create_offer('Logo', [['Logo-Design', 'Quelldateien'], ['Logo-Design', 'Visitenkarte'], []])
+        self.web = self.create_offer('Webseite', [['Hosting'], ['Hosting', 'SEO'], []])
+
+    def create_offer(self, title, feature_lists):
+        data = {
+            'title': title,
+            'description': 'desc',
+            'details': [
+                {'title': offer_type, 'revisions': 1, 'delivery_time_in_days': 5, 'price': 100 * (n + 1),
+                 'features': features, 'offer_type': offer_type}
+                for n, (offer_type, features) in enumerate(zip(['basic', 'standard', 'premium'], feature_lists))
+            ],
+        }
+        response = self.client.post(reverse('offer-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Offer.objects.get(pk=response.data['id'])
+
+    def titles(self, params):
+        cache.clear()
+        response = self.client.get(reverse('offer-list'), {**params, 'page_size': 10})
+        return sorted(offer['title'] for offer in response.data['results'])
+
+    def test_create_fills_feature_index(self):
+        names = OfferFeature.objects.filter(offer=self.logo).values_list('name', flat=True)
+        self.assertEqual(sorted(names), ['logo-design', 'logo-design', 'quelldateien', 'visitenkarte'])
+
+    def test_features_matches_any_name_case_insensitively(self):
+        self.assertEqual(self.titles({'features': ' seo '}), ['Webseite'])
+        self.assertEqual(self.titles({'features': 'SEO,Visitenkarte'}), ['Logo', 'Webseite'])
+        self.assertEqual(self.titles({'features': 'Druck'}), [])
+
+    def test_features_all_requires_every_name(self):
+        self.assertEqual(self.titles({'features_all': 'Quelldateien,Visitenkarte'}), ['Logo'])
+        self.assertEqual(self.titles({'features_all': 'Hosting,Visitenkarte'}), [])
+
+    def test_index_follows_detail_updates_and_deletes(self):
+        basic = self.web.details.get(offer_type='basic')
+        response = self.client.patch(
+            reverse('offer-detail', args=[self.web.id]),
+            {'details': [{'id': basic.id, 'offer_type': 'basic', 'features': ['Domain']}]}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.titles({'features': 'domain'}), ['Webseite'])
+        detail = self.web.details.get(offer_type='standard')
+        detail.features = ['Newsletter']
+        detail.save()
+        self.assertEqual(self.titles({'features': 'seo'}), [])
+        detail.delete()
+        self.assertEqual(self.titles({'features': 'newsletter'}), [])
+
+    def test_feature_filter_uses_index(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('offer-list'), {'features_all': 'Hosting,SEO', 'page_size': 10})
+        select = next(q['sql'] for q in context.captured_queries if 'offer_features' in q['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {select}')
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('offer_features_name_offer_idx', plan)
+        self.assertNotIn('SCAN offer_features', plan)
+
+    def test_rebuild_command(self):
+        OfferFeature.objects.all().delete()
+        call_command('rebuild_offer_feature_index', stdout=StringIO())
+        self.assertEqual(OfferFeature.objects.count(), 7)
+
+
+class OfferTagTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.business = User.objects.create_user(username='biz', password='testpass', user_type='business')
+        self.client.force_authenticate(user=self.business)
+        self.design = Tag.objects.create(name='Design', slug='design')
+        self.web = Tag.objects.create(name='Web', slug='web')
+        self.print = Tag.objects.create(name='Print', slug='print')
+
+    def create_offer(self, title, tags):
+        data = {
+            'title': title,
+            'description': 'desc',
+            'tags': tags,
+            'details': [
+                {'title': offer_type, 'revisions': 1, 'delivery_time_in_days': 5, 'price': 100 * (n + 1),
+                 'features': [], 'offer_type': offer_type}
+                for n, offer_type in enumerate(['basic', 'standard', 'premium'])
+            ],
+        }
+        response = self.client.post(reverse('offer-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return Offer.objects.get(pk=response.data['id'])
+
+    def counts(self):
+        response = self.client.get(reverse('offer-tags'))
+        return {tag['slug']: tag['offer_count'] for tag in response.data}
+
+    def titles(self, params):
+        cache.clear()
+        response = self.client.get(reverse('offer-list'), {**params, 'page_size': 10})
+        return sorted(offer['title'] for offer in response.data['results'])
+
+    def test_counts_follow_add_set_remove_clear_and_delete(self):
+        logo = self.create_offer('Logo', ['design', 'print'])
+        shop = self.create_offer('Shop', ['design', 'web'])
+        self.assertEqual(self.counts(), {'design': 2, 'web': 1, 'print': 1})
+        logo.tags.add(self.design, self.web)
+        self.assertEqual(self.counts(), {'design': 2, 'web': 2, 'print': 1})
+        logo.tags.remove(self.print, self.print)
+        shop.tags.set([self.web])
+        self.assertEqual(self.counts(), {'design': 1, 'web': 2, 'print': 0})
+        self.web.offers.remove(shop)
+        self.assertEqual(self.counts(), {'design': 1, 'web': 1, 'print': 0})
+        logo.tags.clear()
+        shop.tags.add(self.print)
+        self.design.offers.add(shop)
+        logo.delete()
+        self.assertEqual(self.counts(), {'design': 1, 'web': 0, 'print': 1})
+        self.assertEqual(tags.recount(), 0)
+
+    def test_count_endpoint_reads_stored_counts(self):
+        self.create_offer('Logo', ['design'])
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('offer-tags'))
+        self.assertEqual(response.data[0], {'slug': 'design', 'name': 'Design', 'offer_count': 1})
+
+    def test_tag_filters(self):
+        self.create_offer('Logo', ['design', 'print'])
+        self.create_offer('Shop', ['design', 'web'])
+        self.create_offer('Texte', [])
+        self.assertEqual(self.titles({'tags': 'print,web'}), ['Logo', 'Shop'])
+        self.assertEqual(self.titles({'tags_all': 'design,web'}), ['Shop'])
+        self.assertEqual(self.titles({'tags': 'Design'}), ['Logo', 'Shop'])
+
+    def test_tags_are_shown_and_updated_on_offer(self):
+        offer = self.create_offer('Logo', ['design'])
+        self.assertEqual(self.client.get(reverse('offer-detail', args=[offer.id])).data['tags'], ['design'])
+        response = self.client.patch(reverse('offer-detail', args=[offer.id]), {'tags': ['web']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse('offer-list'), {'page_size': 10}).data['results'][0]['tags'], ['web'])
+
+    def test_deleted_tag_disappears_from_cards_and_cached_lists(self):
+        offer = self.create_offer('Logo', ['design', 'web'])
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(reverse('offer-list')).data['results'][0]['tags'], ['design', 'web'])
+        self.design.delete()
+        self.assertEqual(self.client.get(reverse('offer-list')).data['results'][0]['tags'], ['web'])
+        self.client.force_authenticate(user=self.business)
+        self.assertEqual(self.client.get(reverse('offer-list')).data['results'][0]['tags'], ['web'])
+        self.assertEqual(self.client.get(reverse('offer-detail', args=[offer.id])).data['tags'], ['web'])
+
+    def test_unknown_tag_is_rejected(self):
+        data = {'title': 'Logo', 'description': 'desc', 'tags': ['gibtsnicht'], 'details': []}
+        response = self.client.post(reverse('offer-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', response.data)
+
+    def test_bulk_import_links_and_counts_tags(self):
+        records = [
+            {'title': f'Angebot {i}', 'description': 'desc', 'tags': ['design', 'web'][:i % 2 + 1], 'details': [
+                {'title': offer_type, 'revisions': 1, 'delivery_time_in_days': 5, 'price': 100, 'features': [], 'offer_type': offer_type}
+                for offer_type in ['basic', 'standard', 'premium']
+            ]}
+            for i in range(4)
+        ]
+        import_offers(records, self.business)
+        self.assertEqual(self.counts(), {'design': 4, 'web': 2, 'print': 0})
+        Tag.objects.update(offer_count=0)
+        call_command('recount_offer_tags', stdout=StringIO())
+        self.assertEqual(self.counts(), {'design': 4, 'web': 2, 'print': 0})
+
+    def test_tag_filter_uses_indexes(self):
+        self.create_offer('Logo', ['design'])
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('offer-list'), {'tags_all': 'design,web', 'page_size': 10})
+        self.assertEqual(full_table_scans(context.captured_queries), [])
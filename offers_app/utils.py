@@ -0,0 +1,8 @@
+"""Small helpers shared by the offer API, facets and export."""
+
+
+def price_as_int_or_float(value):
+    """Decimal price as it appears in JSON: whole amounts as int, others as float, None stays None"""
+    if value is None:
+        return None
+    return int(value) if float(value).is_integer() else float(value)
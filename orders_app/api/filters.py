@@ -0,0 +1,14 @@
+from django_filters import rest_framework as filters
+
+from ..models import Order
+
+
+class OrderFilterSet(filters.FilterSet):
+    """Status and creation date range (created_after inclusive, created_before exclusive)"""
+    status = filters.ChoiceFilter(choices=Order.STATUS_CHOICES)
+    created_after = filters.DateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = filters.DateTimeFilter(field_name='created_at', lookup_expr='lt')
+
+    class Meta:
+        model = Order
+        fields = ['status', 'created_after', 'created_before']
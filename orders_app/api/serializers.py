@@ -1,5 +1,4 @@
 from rest_framework import serializers
-from offers_app.models import OfferDetail
 from ..models import Order
 
 """Serializer for order count response"""
@@ -30,21 +29,20 @@ class OrderStatusUpdateResponseSerializer(serializers.Serializer):
 class OrderCreateRequestSerializer(serializers.Serializer):
     offer_detail_id = serializers.IntegerField(required=True)
 
-"""Serializer for listing orders with offer detail info"""
+# Most orders a single batch request may create
+ORDER_BATCH_LIMIT = 100
+
+"""Serializer for batch order create request"""
+class OrderBatchCreateRequestSerializer(serializers.Serializer):
+    offer_detail_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=ORDER_BATCH_LIMIT
+    )
+
+"""Serializer for listing orders, read from the order's own snapshot columns"""
 class OrderListSerializer(serializers.ModelSerializer):
-    def get_offer_detail(self, obj):
-       
-        if hasattr(obj, 'offer_detail_id') and obj.offer_detail_id:
-            try:
-                return OfferDetail.objects.get(id=obj.offer_detail_id)
-            except OfferDetail.DoesNotExist:
-                return None
-        elif hasattr(obj, 'offer_id') and obj.offer_id:
-            return OfferDetail.objects.filter(offer_id=obj.offer_id).first()
-        elif hasattr(obj, 'offer') and obj.offer:
-            return OfferDetail.objects.filter(offer=obj.offer).first()
-        return None
-    offer_type = serializers.SerializerMethodField()
+    customer_user = serializers.PrimaryKeyRelatedField(source='customer', read_only=True)
+    business_user = serializers.PrimaryKeyRelatedField(source='business', read_only=True)
+    price = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
@@ -62,39 +60,10 @@ class OrderListSerializer(serializers.ModelSerializer):
             'created_at',
             'updated_at',
         ]
-    customer_user = serializers.PrimaryKeyRelatedField(source='customer', read_only=True)
-    business_user = serializers.PrimaryKeyRelatedField(source='business', read_only=True)
-    title = serializers.SerializerMethodField()
-    revisions = serializers.SerializerMethodField()
-    delivery_time_in_days = serializers.SerializerMethodField()
-    price = serializers.SerializerMethodField()
-    features = serializers.SerializerMethodField()
-
-    def get_title(self, obj):
-        offer_detail = self.get_offer_detail(obj)
-        return offer_detail.title if offer_detail else None
-
-    def get_revisions(self, obj):
-        offer_detail = self.get_offer_detail(obj)
-        return offer_detail.revisions if offer_detail else None
-
-    def get_delivery_time_in_days(self, obj):
-        offer_detail = self.get_offer_detail(obj)
-        return offer_detail.delivery_time_in_days if offer_detail else None
+        read_only_fields = ['title', 'revisions', 'delivery_time_in_days', 'features', 'offer_type']
 
     def get_price(self, obj):
-        offer_detail = self.get_offer_detail(obj)
-        return offer_detail.price if offer_detail else None
-
-    def get_features(self, obj):
-        offer_detail = self.get_offer_detail(obj)
-        if offer_detail and hasattr(offer_detail, 'features'):
-            return offer_detail.features
-        return []
-
-    def get_offer_type(self, obj):
-        offer_detail = self.get_offer_detail(obj)
-        return offer_detail.offer_type if offer_detail else None
+        return obj.total_price
 
     def create(self, validated_data):
         request = self.context.get('request')
@@ -108,10 +77,9 @@ class OrderListSerializer(serializers.ModelSerializer):
                 offer_detail = OfferDetail.objects.select_related('offer', 'offer__business_user').get(id=offer_detail_id)
             except OfferDetail.DoesNotExist:
                 raise serializers.ValidationError({'offer_detail_id': 'Ungültige offer_detail_id.'})
-            offer = offer_detail.offer
-            validated_data['offer'] = offer
-            validated_data['business'] = offer.business_user
-            validated_data['total_price'] = offer_detail.price
+            order = Order.from_offer_detail(offer_detail, **validated_data)
+            order.save()
+            return order
         else:
             offer = validated_data.get('offer')
             if offer:
@@ -1,20 +1,42 @@
-from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.db import transaction
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from ..models import Order
+from .. import stats
 from rest_framework import serializers
 
 from .serializers import (
-    OrderListSerializer, OrderCreateResponseSerializer, OrderCreateRequestSerializer,
+    OrderListSerializer, OrderCreateResponseSerializer, OrderCreateRequestSerializer, OrderBatchCreateRequestSerializer,
     OrderStatusUpdateRequestSerializer, OrderStatusUpdateResponseSerializer, OrderCountResponseSerializer
 )
 from offers_app.models import Offer, OfferDetail
-from rest_framework.pagination import PageNumberPagination
+from offers_app import detail_cache
+from .filters import OrderFilterSet
+from .pagination import OrderCursorPagination
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 
 
+def order_response_data(order):
+    """Response body of order create and status updates, taken from the order's snapshot columns"""
+    return {
+        'id': order.id,
+        'customer_user': order.customer_id,
+        'business_user': order.business_id,
+        'title': order.title,
+        'revisions': order.revisions,
+        'delivery_time_in_days': order.delivery_time_in_days,
+        'price': float(order.total_price),
+        'features': order.features,
+        'offer_type': order.offer_type,
+        'status': order.status,
+        'created_at': order.created_at,
+        'updated_at': order.updated_at,
+    }
+
+
 class OrderViewSet(viewsets.ModelViewSet):
     def update(self, request, *args, **kwargs):
         user = request.user
@@ -24,7 +46,8 @@ class OrderViewSet(viewsets.ModelViewSet):
         # Nur Admin oder zugehöriger Business-User darf updaten
         if not (user.is_staff or (hasattr(order, 'business') and order.business == user)):
             return Response({'detail': 'Only the business user or admin can update orders.'}, status=403)
-        return super().update(request, *args, **kwargs)
+        with transaction.atomic():
+            return super().update(request, *args, **kwargs)
 
     def partial_update(self, request, *args, **kwargs):
         user = request.user
@@ -34,21 +57,52 @@ class OrderViewSet(viewsets.ModelViewSet):
         # Nur Admin oder zugehöriger Business-User darf updaten
         if not (user.is_staff or (hasattr(order, 'business') and order.business == user)):
             return Response({'detail': 'Only the business user or admin can update orders.'}, status=403)
-        return super().partial_update(request, *args, **kwargs)
+        with transaction.atomic():
+            return super().partial_update(request, *args, **kwargs)
+
+    pagination_class = OrderCursorPagination
+    filterset_class = OrderFilterSet
+    # Default of the OrderingFilter, ?ordering= overrides it in both list modes
+    ordering = ['-created_at', 'id']
 
-    pagination_class = None
+    @property
+    def paginator(self):
+        """Keyset pagination when the client opts in with ?cursor=, a plain (size-limited) list otherwise"""
+        if not hasattr(self, '_paginator'):
+            if OrderCursorPagination.cursor_query_param in self.request.query_params:
+                self._paginator = OrderCursorPagination()
+            else:
+                self._paginator = None
+        return self._paginator
+
+    def list(self, request, *args, **kwargs):
+        """Orders of the user, cursor-paginated with ?cursor= or as a plain list up to ORDER_UNPAGINATED_LIMIT"""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        limit = settings.ORDER_UNPAGINATED_LIMIT
+        orders = list(queryset[:limit + 1])
+        if len(orders) > limit:
+            return Response(
+                {'detail': f'Mehr als {limit} Bestellungen gefunden. Bitte mit ?cursor= seitenweise abrufen.'},
+                status=400,
+            )
+        serializer = self.get_serializer(orders, many=True)
+        return Response(serializer.data)
 
     @action(detail=False, methods=['get'], url_path='order-count/(?P<business_user_id>[^/.]+)')
     def order_count(self, request, business_user_id=None):
         """Get the count of orders for a specific business user with status 'in_progress'"""
-        User = get_user_model()
         if not request.user.is_authenticated:
             return Response({'detail': 'Authentication required.'}, status=401)
         try:
-            business_user = User.objects.get(id=business_user_id, user_type='business')
-        except User.DoesNotExist:
+            count = stats.get_count(int(business_user_id), 'in_progress')
+        except ValueError:
+            count = None
+        if count is None:
             return Response({'detail': 'Kein Geschäftsnutzer mit dieser ID gefunden.'}, status=404)
-        count = Order.objects.filter(business=business_user, status='in_progress').count()
         serializer = OrderCountResponseSerializer({'order_count': count})
         return Response(serializer.data, status=200)
     def destroy(self, request, *args, **kwargs):
@@ -62,7 +116,8 @@ class OrderViewSet(viewsets.ModelViewSet):
             order = self.get_object()
         except Order.DoesNotExist:
             return Response({'detail': 'Die angegebene Bestellung wurde nicht gefunden.'}, status=404)
-        order.delete()
+        with transaction.atomic():
+            order.delete()
         return Response(None, status=204)
     
 
@@ -86,10 +141,8 @@ class OrderViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def my_orders(self, request):
-        """Get orders for current user"""
-        orders = self.get_queryset()
-        serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data)
+        """Get orders for current user, with the same filters and pagination as the list"""
+        return self.list(request)
 
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
@@ -98,7 +151,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         user = request.user
         if not user.is_authenticated:
             return Response({'detail': 'Authentication required.'}, status=401)
-        if user != order.business:
+        if user.pk != order.business_id:
             return Response({'detail': 'Only the business user can update status.'}, status=403)
         serializer = OrderStatusUpdateRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -107,29 +160,10 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Invalid status.'}, status=400)
 
         order.status = status_value
-        order.save()
-
-        offer_detail = None
-        from offers_app.models import OfferDetail
-        if hasattr(order, 'offer_id') and order.offer_id:
-            offer_detail = OfferDetail.objects.filter(offer_id=order.offer_id).first()
-        elif hasattr(order, 'offer') and order.offer:
-            offer_detail = OfferDetail.objects.filter(offer=order.offer).first()
-
-        response_data = {
-            'id': order.id,
-            'customer_user': order.customer.id,
-            'business_user': order.business.id,
-            'title': offer_detail.title if offer_detail else '',
-            'revisions': offer_detail.revisions if offer_detail else None,
-            'delivery_time_in_days': offer_detail.delivery_time_in_days if offer_detail else None,
-            'price': float(offer_detail.price) if offer_detail else None,
-            'features': offer_detail.features if offer_detail else [],
-            'offer_type': offer_detail.offer_type if offer_detail else '',
-            'status': order.status,
-            'created_at': order.created_at,
-            'updated_at': order.updated_at,
-        }
+        with transaction.atomic():
+            order.save(update_fields=['status', 'updated_at'])
+
+        response_data = order_response_data(order)
         response_serializer = OrderStatusUpdateResponseSerializer(response_data)
         return Response(response_serializer.data, status=200)
 
@@ -145,49 +179,53 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         offer_detail_id = serializer.validated_data['offer_detail_id']
 
-        from offers_app.models import OfferDetail
-        try:
-            offer_detail = OfferDetail.objects.select_related('offer__business_user').get(pk=offer_detail_id)
-        except OfferDetail.DoesNotExist:
+        offer_detail = detail_cache.get_detail(offer_detail_id)
+        if offer_detail is None:
             return Response({'detail': 'OfferDetail not found.'}, status=404)
 
-        offer = offer_detail.offer
-        business_user = offer.business_user
-
-        """Create order"""
-        order = Order.objects.create(
-            customer=user,
-            business=business_user,
-            offer=offer,
-            total_price=offer_detail.price,
-            status='in_progress',
-        )
-
-        """Save optional fields as notes"""
-        notes = f"Order created from OfferDetail: {offer_detail.title}\n"
-        notes += f"Revisions: {offer_detail.revisions}, Delivery: {offer_detail.delivery_time_in_days} days\n"
-        notes += f"Features: {', '.join(offer_detail.features) if offer_detail.features else ''}\n"
-        notes += f"Offer type: {offer_detail.offer_type}"
-        order.notes = notes
-        order.save()
-
-        response_data = {
-            'id': order.id,
-            'customer_user': order.customer.id,
-            'business_user': order.business.id,
-            'title': offer_detail.title,
-            'revisions': offer_detail.revisions,
-            'delivery_time_in_days': offer_detail.delivery_time_in_days,
-            'price': float(offer_detail.price),
-            'features': offer_detail.features,
-            'offer_type': offer_detail.offer_type,
-            'status': order.status,
-            'created_at': order.created_at,
-            'updated_at': order.updated_at,
-        }
+        """Create order, with the tier snapshotted, in a single INSERT"""
+        order = Order.from_offer_detail(offer_detail, customer=user, status='in_progress')
+        with transaction.atomic():
+            order.save()
+
+        response_data = order_response_data(order)
         response_serializer = OrderCreateResponseSerializer(response_data)
         return Response(response_serializer.data, status=201)
 
+    @action(detail=False, methods=['post'], url_path='batch')
+    def create_batch(self, request):
+        """POST /orders/batch/ – Create one order per offer detail id in one transaction, with a result per item"""
+        user = request.user
+        if not user.is_authenticated:
+            return Response({'detail': 'Authentication required.'}, status=401)
+        if user.user_type != 'customer':
+            return Response({'detail': 'Only customers can create orders.'}, status=403)
+        serializer = OrderBatchCreateRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['offer_detail_ids']
+
+        # All tiers in one query; unknown ids become per-item errors
+        details = OfferDetail.objects.select_related('offer').in_bulk(set(ids))
+        results, orders = [], []
+        for value in ids:
+            detail = details.get(value)
+            if detail is None:
+                results.append({'offer_detail_id': value, 'error': 'OfferDetail not found.'})
+                continue
+            order = Order.from_offer_detail(detail, customer=user, status='in_progress')
+            orders.append(order)
+            results.append({'offer_detail_id': value, 'order': order})
+
+        with transaction.atomic():
+            Order.objects.bulk_create(orders)
+            # bulk_create sends no signals
+            stats.adjust_many(orders)
+
+        for result in results:
+            if 'order' in result:
+                result['order'] = OrderCreateResponseSerializer(order_response_data(result['order'])).data
+        return Response({'created': len(orders), 'results': results}, status=201 if orders else 400)
+
     @action(detail=False, methods=['post'], url_path='create-from-offer-detail')
     def create_from_offer_detail(self, request):
         """Create a new order based on OfferDetail (only for customer users)"""
@@ -202,45 +240,18 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Response({'detail': "'offer_detail_id' is required."}, status=400)
 
         try:
-            offer_detail = OfferDetail.objects.select_related('offer__business_user').get(pk=offer_detail_id)
-        except OfferDetail.DoesNotExist:
+            offer_detail = detail_cache.get_detail(int(offer_detail_id))
+        except (TypeError, ValueError):
+            offer_detail = None
+        if offer_detail is None:
             return Response({'detail': 'OfferDetail not found.'}, status=404)
 
-        offer = offer_detail.offer
-        business_user = offer.business_user
-
-        """Create order"""
-        order = Order.objects.create(
-            customer=user,
-            business=business_user,
-            offer=offer,
-            total_price=offer_detail.price,
-            status='in_progress',
-        )
-
-        """Save optional fields as notes"""
-        notes = f"Order created from OfferDetail: {offer_detail.title}\n"
-        notes += f"Revisions: {offer_detail.revisions}, Delivery: {offer_detail.delivery_time_in_days} days\n"
-        notes += f"Features: {', '.join(offer_detail.features) if offer_detail.features else ''}\n"
-        notes += f"Offer type: {offer_detail.offer_type}"
-        order.notes = notes
-        order.save()
-
-        from .serializers import OrderCreateResponseSerializer
-        response_data = {
-            'id': order.id,
-            'customer_user': order.customer.id,
-            'business_user': order.business.id,
-            'title': offer_detail.title,
-            'revisions': offer_detail.revisions,
-            'delivery_time_in_days': offer_detail.delivery_time_in_days,
-            'price': float(offer_detail.price),
-            'features': offer_detail.features,
-            'offer_type': offer_detail.offer_type,
-            'status': order.status,
-            'created_at': order.created_at,
-            'updated_at': order.updated_at,
-        }
+        """Create order, with the tier snapshotted, in a single INSERT"""
+        order = Order.from_offer_detail(offer_detail, customer=user, status='in_progress')
+        with transaction.atomic():
+            order.save()
+
+        response_data = order_response_data(order)
         serializer = OrderCreateResponseSerializer(response_data)
         return Response(serializer.data, status=201)
     
@@ -248,12 +259,10 @@ class OrderCountView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, business_user_id):
-        User = get_user_model()
-        try:
-            business_user = User.objects.get(id=business_user_id, user_type='business')
-        except User.DoesNotExist:
+        """In-progress orders of a business user, one primary key read of its counter row"""
+        count = stats.get_count(business_user_id, 'in_progress')
+        if count is None:
             return Response({'detail': 'Kein Geschäftsnutzer mit dieser ID gefunden.'}, status=404)
-        count = Order.objects.filter(business=business_user, status='in_progress').count()
         serializer = OrderCountResponseSerializer({'order_count': count})
         return Response(serializer.data, status=200)
     
@@ -266,11 +275,8 @@ class CompletedOrderCountView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, business_user_id):
-        User = get_user_model()
-        try:
-            business_user = User.objects.get(id=business_user_id, user_type='business')
-        except User.DoesNotExist:
+        count = stats.get_count(business_user_id, 'completed')
+        if count is None:
             return Response({'detail': 'Kein Geschäftsnutzer mit dieser ID gefunden.'}, status=404)
-        count = Order.objects.filter(business=business_user, status='completed').count()
         serializer = CompletedOrderCountResponseSerializer({'completed_order_count': count})
         return Response(serializer.data, status=200)
\ No newline at end of file
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from orders_app.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-business order counters (business_order_stats) from the orders'
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt order counters of {count} business users.'))
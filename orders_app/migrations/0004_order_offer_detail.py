@@ -0,0 +1,40 @@
+# Generated by Django 5.0 on 2026-10-18 03:33
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+OFFER_TYPE_NOTE = re.compile(r'^Offer type: (\w+)$', re.MULTILINE)
+
+
+def backfill_offer_details(apps, schema_editor):
+    """Link existing orders to the tier named in their notes, else to the tier matching their price"""
+    Order = apps.get_model('orders_app', 'Order')
+    OfferDetail = apps.get_model('offers_app', 'OfferDetail')
+    orders = Order.objects.filter(offer_detail__isnull=True, offer__isnull=False)
+    for order in orders.only('id', 'offer_id', 'notes', 'total_price').iterator(chunk_size=1000):
+        details = OfferDetail.objects.filter(offer_id=order.offer_id).order_by('id')
+        match = OFFER_TYPE_NOTE.search(order.notes or '')
+        detail = details.filter(offer_type=match.group(1)).first() if match else None
+        if detail is None:
+            detail = details.filter(price=order.total_price).first()
+        if detail is not None:
+            Order.objects.filter(pk=order.pk).update(offer_detail=detail)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers_app', '0011_offer_tags'),
+        ('orders_app', '0003_order_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='offer_detail',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='offers_app.offerdetail'),
+        ),
+        migrations.RunPython(backfill_offer_details, migrations.RunPython.noop),
+    ]
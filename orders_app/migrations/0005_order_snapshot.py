@@ -0,0 +1,62 @@
+# Generated by Django 5.0 on 2026-10-18 03:35
+
+from django.db import migrations, models
+
+SNAPSHOT_FIELDS = ['title', 'revisions', 'delivery_time_in_days', 'features', 'offer_type']
+
+
+def backfill_snapshots(apps, schema_editor):
+    """Snapshot the linked tier of existing orders, or the offer's cheapest tier for unlinked ones"""
+    Order = apps.get_model('orders_app', 'Order')
+    OfferDetail = apps.get_model('offers_app', 'OfferDetail')
+    batch = []
+    for order in Order.objects.filter(offer__isnull=False).only('id', 'offer_id', 'offer_detail_id').iterator(chunk_size=1000):
+        details = OfferDetail.objects.filter(offer_id=order.offer_id)
+        if order.offer_detail_id:
+            details = details.filter(pk=order.offer_detail_id)
+        detail = details.order_by('price', 'id').first()
+        if detail is None:
+            continue
+        for field in SNAPSHOT_FIELDS:
+            setattr(order, field, getattr(detail, field))
+        batch.append(order)
+        if len(batch) >= 1000:
+            Order.objects.bulk_update(batch, SNAPSHOT_FIELDS)
+            batch = []
+    Order.objects.bulk_update(batch, SNAPSHOT_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders_app', '0004_order_offer_detail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='delivery_time_in_days',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='features',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='offer_type',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='revisions',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='title',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
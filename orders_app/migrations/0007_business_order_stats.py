@@ -0,0 +1,48 @@
+# Generated by Django 5.0 on 2026-10-18 03:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_order_stats(apps, schema_editor):
+    User = apps.get_model('profiles_app', 'User')
+    Order = apps.get_model('orders_app', 'Order')
+    BusinessOrderStats = apps.get_model('orders_app', 'BusinessOrderStats')
+    counts = {}
+    for row in Order.objects.order_by().values('business_id', 'status').annotate(count=Count('pk')):
+        counts.setdefault(row['business_id'], {})[row['status']] = row['count']
+    business_ids = set(User.objects.filter(user_type='business').values_list('pk', flat=True)) | set(counts)
+    BusinessOrderStats.objects.bulk_create([
+        BusinessOrderStats(business_id=business_id, **{
+            status: counts.get(business_id, {}).get(status, 0)
+            for status in ['pending', 'in_progress', 'completed', 'cancelled']
+        })
+        for business_id in business_ids
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders_app', '0006_order_list_indexes'),
+        ('profiles_app', '0002_customerprofile_description_customerprofile_location_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BusinessOrderStats',
+            fields=[
+                ('business', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('pending', models.IntegerField(default=0)),
+                ('in_progress', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'business_order_stats',
+            },
+        ),
+        migrations.RunPython(backfill_order_stats, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,6 @@
 from django.db import models
 from profiles_app.models import User
-from offers_app.models import Offer
+from offers_app.models import Offer, OfferDetail
 
 
 class Order(models.Model):
@@ -24,6 +24,14 @@ class Order(models.Model):
         limit_choices_to={'user_type': 'business'}
     )
     offer = models.ForeignKey(Offer, on_delete=models.SET_NULL, null=True, related_name='orders')
+    # The tier that was purchased; null for orders placed before it was recorded
+    offer_detail = models.ForeignKey(OfferDetail, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
+    # Snapshot of the purchased tier, taken at purchase time and never re-read from offer_details
+    title = models.CharField(max_length=255, blank=True)
+    revisions = models.IntegerField(null=True, blank=True)
+    delivery_time_in_days = models.IntegerField(null=True, blank=True)
+    features = models.JSONField(default=list, blank=True)
+    offer_type = models.CharField(max_length=20, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     notes = models.TextField(blank=True)
@@ -33,6 +41,62 @@ class Order(models.Model):
     class Meta:
         db_table = 'orders'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['business', 'status', '-created_at'], name='orders_business_status_idx'),
+            models.Index(fields=['business', '-created_at'], name='orders_business_created_idx'),
+            models.Index(fields=['customer', 'status', '-created_at'], name='orders_customer_status_idx'),
+            models.Index(fields=['customer', '-created_at'], name='orders_customer_created_idx'),
+            models.Index(fields=['-created_at', 'id'], name='orders_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the loaded business and status, so saves can move the BusinessOrderStats counters"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_counter = (instance.__dict__.get('business_id'), instance.__dict__.get('status'))
+        return instance
+
+    @classmethod
+    def from_offer_detail(cls, offer_detail, **kwargs):
+        """Unsaved order for offer_detail with the tier snapshotted into the order's own columns.
+
+        offer_detail only needs offer_id and offer.business_user_id, so the stub
+        instances of offers_app.detail_cache work as well.
+        """
+        features = list(offer_detail.features or [])
+        return cls(
+            business_id=offer_detail.offer.business_user_id,
+            offer_id=offer_detail.offer_id,
+            offer_detail_id=offer_detail.pk,
+            total_price=offer_detail.price,
+            title=offer_detail.title,
+            revisions=offer_detail.revisions,
+            delivery_time_in_days=offer_detail.delivery_time_in_days,
+            features=features,
+            offer_type=offer_detail.offer_type,
+            notes=(
+                f"Order created from OfferDetail: {offer_detail.title}\n"
+                f"Revisions: {offer_detail.revisions}, Delivery: {offer_detail.delivery_time_in_days} days\n"
+                f"Features: {', '.join(features)}\n"
+                f"Offer type: {offer_detail.offer_type}"
+            ),
+            **kwargs
+        )
 
     def __str__(self):
         return f"Order #{self.id} - {self.customer.username} -> {self.business.username}"
+
+
+class BusinessOrderStats(models.Model):
+    """Number of orders per status of a business user, maintained by orders_app.stats"""
+    business = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='order_stats')
+    pending = models.IntegerField(default=0)
+    in_progress = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    cancelled = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'business_order_stats'
+
+    def __str__(self):
+        return f"Order stats of user #{self.business_id}"
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from profiles_app.models import User
+from .models import Order
+from . import stats
+
+
+@receiver(post_save, sender=Order)
+def count_order_on_save(sender, instance, created, **kwargs):
+    """Move the BusinessOrderStats counters from the loaded (business, status) to the saved one"""
+    current = (instance.business_id, instance.status)
+    if created:
+        stats.adjust(current[0], {current[1]: 1})
+    else:
+        previous = getattr(instance, '_loaded_counter', None)
+        if previous is None or previous == current:
+            return
+        if previous[0] == current[0]:
+            stats.adjust(current[0], {previous[1]: -1, current[1]: 1})
+        else:
+            stats.adjust(previous[0], {previous[1]: -1})
+            stats.adjust(current[0], {current[1]: 1})
+    instance._loaded_counter = current
+
+
+@receiver(post_delete, sender=Order)
+def count_order_on_delete(sender, instance, **kwargs):
+    business_id, status = getattr(instance, '_loaded_counter', (instance.business_id, instance.status))
+    stats.adjust(business_id, {status: -1})
+
+
+@receiver(post_save, sender=User)
+def create_order_stats_for_business(sender, instance, created, **kwargs):
+    """Every business user gets a counter row, so a missing row means "not a business user\""""
+    if created and instance.user_type == 'business':
+        stats.ensure_row(instance.pk)
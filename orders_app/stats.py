@@ -0,0 +1,70 @@
+"""Per-business order counters by status (``BusinessOrderStats``)."""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from profiles_app.models import User
+from .models import BusinessOrderStats, Order
+
+STATUSES = [value for value, _label in Order.STATUS_CHOICES]
+
+
+def adjust(business_id, deltas):
+    """Add {status: delta} to the counters of a business, creating its row if needed"""
+    deltas = {status: delta for status, delta in deltas.items() if delta}
+    if not deltas or business_id is None:
+        return
+    updates = {status: F(status) + delta for status, delta in deltas.items()}
+    if BusinessOrderStats.objects.filter(pk=business_id).update(**updates):
+        return
+    if min(deltas.values()) < 0:
+        # Nothing counted for this business (e.g. its row was just deleted along with it)
+        return
+    try:
+        with transaction.atomic():
+            BusinessOrderStats.objects.create(business_id=business_id, **deltas)
+    except IntegrityError:
+        # Created concurrently (or the user is gone); retry the increment
+        BusinessOrderStats.objects.filter(pk=business_id).update(**updates)
+
+
+def adjust_many(orders, sign=1):
+    """Count a batch of orders in (sign=1) or out (sign=-1), one UPDATE per business"""
+    per_business = {}
+    for order in orders:
+        per_business.setdefault(order.business_id, Counter())[order.status] += sign
+    for business_id, deltas in per_business.items():
+        adjust(business_id, deltas)
+
+
+def ensure_row(business_id):
+    BusinessOrderStats.objects.get_or_create(business_id=business_id)
+
+
+def get_count(business_user_id, status):
+    """Orders of a business user with status, or None if there is no such business user"""
+    count = BusinessOrderStats.objects.filter(pk=business_user_id).values_list(status, flat=True).first()
+    if count is not None:
+        return count
+    # No row yet: only businesses created before the table or with a changed user_type
+    if User.objects.filter(pk=business_user_id, user_type='business').exists():
+        return 0
+    return None
+
+
+def rebuild():
+    """Recompute the counters of all business users from the orders table, returns the number of rows written"""
+    counts = {}
+    rows = Order.objects.order_by().values('business_id', 'status').annotate(count=Count('pk'))
+    for row in rows:
+        counts.setdefault(row['business_id'], {})[row['status']] = row['count']
+    business_ids = set(User.objects.filter(user_type='business').values_list('pk', flat=True)) | set(counts)
+    stats = [
+        BusinessOrderStats(business_id=business_id, **{status: counts.get(business_id, {}).get(status, 0) for status in STATUSES})
+        for business_id in business_ids
+    ]
+    with transaction.atomic():
+        BusinessOrderStats.objects.all().delete()
+        BusinessOrderStats.objects.bulk_create(stats)
+    return len(stats)
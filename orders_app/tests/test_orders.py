@@ -1,9 +1,17 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from profiles_app.models import User
 from offers_app.models import Offer, OfferDetail
-from orders_app.models import Order
+from orders_app.models import BusinessOrderStats, Order
 from rest_framework import status
+from core.testing import full_table_scans
 
 class OrderTests(APITestCase):
     def test_order_patch_status_response_structure(self):
@@ -144,3 +152,269 @@ class OrderTests(APITestCase):
         url = reverse('completed-order-count', args=[9999])
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+class OrderQueryPlanTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='customer1', password='test123', user_type='customer')
+        self.business = User.objects.create_user(username='business1', password='test123', user_type='business')
+        offer = Offer.objects.create(business_user=self.business, title='Logo Design', description='desc')
+        offer.details.create(title='Basic', delivery_time_in_days=5, price=150, offer_type='basic')
+        for order_status in ['in_progress', 'completed', 'cancelled']:
+            Order.objects.create(
+                customer=self.customer, business=self.business, offer=offer, status=order_status, total_price=150
+            )
+
+    def captured_full_scans(self, user, *paths):
+        self.client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as context:
+            for path in paths:
+                self.assertEqual(self.client.get(path).status_code, status.HTTP_200_OK)
+        return full_table_scans(context.captured_queries)
+
+    def test_business_order_queries_use_indexes(self):
+        scans = self.captured_full_scans(
+            self.business,
+            reverse('order-list'),
+            reverse('order-count', args=[self.business.id]),
+            reverse('completed-order-count', args=[self.business.id]),
+        )
+        self.assertEqual(scans, [])
+
+    def test_customer_order_list_uses_index(self):
+        self.assertEqual(self.captured_full_scans(self.customer, reverse('order-list')), [])
+
+
+class OrderSnapshotTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='customer1', password='test123', user_type='customer')
+        self.business = User.objects.create_user(username='business1', password='test123', user_type='business')
+        self.offers = []
+        for i in range(3):
+            offer = Offer.objects.create(business_user=self.business, title=f'Angebot {i}', description='desc')
+            offer.details.create(title='Premium', delivery_time_in_days=2, price=300, offer_type='premium')
+            basic = offer.details.create(title=f'Basic {i}', delivery_time_in_days=5, price=100, offer_type='basic')
+            Order.from_offer_detail(basic, customer=self.customer).save()
+            self.offers.append(offer)
+        self.client.force_authenticate(user=self.customer)
+
+    def test_order_list_reads_only_the_orders_table(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('order-list'))
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertNotIn('offer_details', context.captured_queries[0]['sql'])
+        self.assertEqual(sorted(o['title'] for o in response.data), ['Basic 0', 'Basic 1', 'Basic 2'])
+
+    def test_order_shows_the_purchased_tier(self):
+        premium = self.offers[1].details.get(offer_type='premium')
+        response = self.client.post(reverse('order-list'), {'offer_detail_id': premium.id}, format='json')
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.offer_detail_id, premium.id)
+        response = self.client.get(reverse('order-detail', args=[order.id]))
+        self.assertEqual((response.data['title'], response.data['offer_type']), ('Premium', 'premium'))
+
+    def test_snapshot_survives_detail_changes(self):
+        detail = self.offers[0].details.get(offer_type='basic')
+        response = self.client.post(reverse('order-list'), {'offer_detail_id': detail.id}, format='json')
+        detail.title = 'Umbenannt'
+        detail.price = 999
+        detail.save()
+        self.offers[0].delete()
+        response = self.client.get(reverse('order-detail', args=[response.data['id']]))
+        self.assertEqual(response.data['title'], 'Basic 0')
+        self.assertEqual(response.data['price'], 100)
+
+    def test_create_order_is_a_single_insert(self):
+        detail = self.offers[0].details.get(offer_type='basic')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('order-list'), {'offer_detail_id': detail.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        writes = [q['sql'] for q in context.captured_queries if q['sql'].startswith(('INSERT INTO "orders"', 'UPDATE "orders"'))]
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('INSERT'))
+        self.assertIn('Offer type: basic', Order.objects.get(pk=response.data['id']).notes)
+
+    def test_order_list_query_count_is_constant(self):
+        details = [offer.details.get(offer_type=offer_type) for offer in self.offers for offer_type in ['basic', 'premium']]
+        Order.objects.bulk_create([Order.from_offer_detail(details[i % 6], customer=self.customer) for i in range(497)])
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('order-list'))
+        self.assertEqual(len(response.data), 500)
+
+    def test_create_order_uses_cached_detail(self):
+        detail = self.offers[0].details.get(offer_type='basic')
+        self.client.post(reverse('order-create-from-offer-detail'), {'offer_detail_id': detail.id}, format='json')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('order-list'), {'offer_detail_id': detail.id}, format='json')
+        # Only the detail's version is read
+        selects = [q['sql'] for q in context.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+        self.assertIn('"cache_versions"', selects[0])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['business_user'], self.business.id)
+        self.assertEqual(response.data['title'], 'Basic 0')
+
+
+class OrderListPaginationTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='customer1', password='test123', user_type='customer')
+        self.business = User.objects.create_user(username='business1', password='test123', user_type='business')
+        offer = Offer.objects.create(business_user=self.business, title='Logo Design', description='desc')
+        detail = offer.details.create(title='Basic', delivery_time_in_days=5, price=150, offer_type='basic')
+        orders = Order.objects.bulk_create([
+            Order.from_offer_detail(detail, customer=self.customer, status=['in_progress', 'completed'][i % 2])
+            for i in range(30)
+        ])
+        now = timezone.now()
+        for i, order in enumerate(orders):
+            order.created_at = now - timedelta(days=i)
+        Order.objects.bulk_update(orders, ['created_at'])
+        self.orders = orders
+        self.client.force_authenticate(user=self.business)
+
+    def test_cursor_walks_all_orders_newest_first(self):
+        seen = []
+        url, params = reverse('order-list'), {'cursor': '', 'page_size': 7}
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url, params)
+            self.assertEqual(set(response.data.keys()), {'next', 'previous', 'results'})
+            seen.extend(order['id'] for order in response.data['results'])
+            url, params = response.data['next'], None
+        self.assertEqual(seen, [order.id for order in self.orders])
+
+    def test_status_and_date_filters(self):
+        since = (timezone.now() - timedelta(days=9, hours=12)).isoformat()
+        response = self.client.get(reverse('order-list'), {'status': 'completed', 'created_after': since})
+        self.assertEqual([o['id'] for o in response.data], [self.orders[i].id for i in [1, 3, 5, 7, 9]])
+        response = self.client.get(reverse('order-my-orders'), {'status': 'gibtsnicht'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ordering_parameter_applies_to_both_list_modes(self):
+        oldest_first = [order.id for order in reversed(self.orders)]
+        response = self.client.get(reverse('order-list'), {'ordering': 'created_at'})
+        self.assertEqual([o['id'] for o in response.data], oldest_first)
+        response = self.client.get(reverse('order-list'), {'ordering': 'created_at', 'cursor': '', 'page_size': 5})
+        self.assertEqual([o['id'] for o in response.data['results']], oldest_first[:5])
+        response = self.client.get(reverse('order-list'))
+        self.assertEqual([o['id'] for o in response.data], [order.id for order in self.orders])
+
+    def test_large_unpaginated_lists_are_refused(self):
+        with self.settings(ORDER_UNPAGINATED_LIMIT=20):
+            response = self.client.get(reverse('order-list'))
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            response = self.client.get(reverse('order-list'), {'status': 'completed'})
+            self.assertEqual(len(response.data), 15)
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+    def test_filtered_pages_use_indexes(self):
+        for user in [self.business, self.customer]:
+            self.client.force_authenticate(user=user)
+            with CaptureQueriesContext(connection) as context:
+                self.client.get(reverse('order-list'), {'cursor': '', 'status': 'completed', 'created_after': '2020-01-01'})
+            self.assertEqual(full_table_scans(context.captured_queries), [])
+
+
+class BusinessOrderStatsTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='customer1', password='test123', user_type='customer')
+        self.business = User.objects.create_user(username='business1', password='test123', user_type='business')
+        self.admin = User.objects.create_user(username='admin1', password='test123', user_type='business', is_staff=True)
+        offer = Offer.objects.create(business_user=self.business, title='Logo Design', description='desc')
+        self.detail = offer.details.create(title='Basic', delivery_time_in_days=5, price=150, offer_type='basic')
+
+    def counts(self):
+        self.client.force_authenticate(user=self.business)
+        in_progress = self.client.get(reverse('order-count', args=[self.business.id])).data['order_count']
+        completed = self.client.get(reverse('completed-order-count', args=[self.business.id])).data['completed_order_count']
+        return in_progress, completed
+
+    def order(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.post(reverse('order-list'), {'offer_detail_id': self.detail.id}, format='json')
+        return response.data['id']
+
+    def test_counters_follow_create_status_update_and_delete(self):
+        first, second = self.order(), self.order()
+        self.assertEqual(self.counts(), (2, 0))
+        self.client.patch(reverse('order-update-status', args=[first]), {'status': 'completed'}, format='json')
+        self.assertEqual(self.counts(), (1, 1))
+        self.client.patch(reverse('order-detail', args=[second]), {'status': 'cancelled'}, format='json')
+        self.assertEqual(self.counts(), (0, 1))
+        self.client.force_authenticate(user=self.admin)
+        self.client.delete(reverse('order-detail', args=[first]))
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_count_endpoints_read_one_row(self):
+        self.order()
+        self.client.force_authenticate(user=self.business)
+        for url in [reverse('order-count', args=[self.business.id]), reverse('completed-order-count', args=[self.business.id]),
+                    reverse('order-order-count', args=[self.business.id])]:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(reverse('order-count', args=[self.customer.id])).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_rebuild_command_repairs_drift(self):
+        self.order()
+        BusinessOrderStats.objects.filter(pk=self.business.pk).update(in_progress=7, completed=3)
+        call_command('rebuild_order_stats', stdout=StringIO())
+        self.assertEqual(self.counts(), (1, 0))
+
+
+
+class OrderBatchCreateTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='customer1', password='test123', user_type='customer')
+        self.business = User.objects.create_user(username='business1', password='test123', user_type='business')
+        self.other = User.objects.create_user(username='business2', password='test123', user_type='business')
+        offer = Offer.objects.create(business_user=self.business, title='Logo Design', description='desc')
+        other_offer = Offer.objects.create(business_user=self.other, title='Website', description='desc')
+        self.details = [
+            offer.details.create(title=f'Tier {index}', delivery_time_in_days=index + 1, price=100 + index,
+                                 features=['Logo'], offer_type='basic')
+            for index in range(4)
+        ] + [other_offer.details.create(title='Premium', delivery_time_in_days=9, price=900, offer_type='premium')]
+        self.url = reverse('order-create-batch')
+        self.client.force_authenticate(user=self.customer)
+
+    def test_creates_all_orders_with_per_item_results(self):
+        ids = [detail.id for detail in self.details]
+        response = self.client.post(self.url, {'offer_detail_ids': ids + [999999, str(ids[0])]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 6)
+        results = response.data['results']
+        self.assertEqual([result['offer_detail_id'] for result in results], ids + [999999, ids[0]])
+        self.assertEqual(results[4]['order']['business_user'], self.other.id)
+        self.assertEqual(results[4]['order']['price'], 900)
+        self.assertEqual(results[0]['order']['features'], ['Logo'])
+        self.assertEqual(results[5], {'offer_detail_id': 999999, 'error': 'OfferDetail not found.'})
+        self.assertEqual(results[6]['order']['title'], 'Tier 0')
+        order = Order.objects.get(pk=results[1]['order']['id'])
+        self.assertEqual((order.customer_id, order.offer_detail_id, order.status),
+                         (self.customer.id, self.details[1].id, 'in_progress'))
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        self.client.post(self.url, {'offer_detail_ids': [self.details[0].id]}, format='json')
+        ids = [detail.id for detail in self.details] * 5
+        # detail lookup, savepoint, orders INSERT, one counter UPDATE per business, release
+        with self.assertNumQueries(6):
+            response = self.client.post(self.url, {'offer_detail_ids': ids}, format='json')
+        self.assertEqual(response.data['created'], 25)
+
+    def test_counters_include_batched_orders(self):
+        self.client.post(self.url, {'offer_detail_ids': [detail.id for detail in self.details]}, format='json')
+        self.client.force_authenticate(user=self.business)
+        self.assertEqual(self.client.get(reverse('order-count', args=[self.business.id])).data['order_count'], 4)
+        self.assertEqual(self.client.get(reverse('order-count', args=[self.other.id])).data['order_count'], 1)
+
+    def test_rejects_invalid_requests(self):
+        for payload in [{}, {'offer_detail_ids': []}, {'offer_detail_ids': 5},
+                        {'offer_detail_ids': [self.details[0].id] * 101}, {'offer_detail_ids': [999999]},
+                        {'offer_detail_ids': [self.details[0].id, 'x']}, [self.details[0].id]]:
+            self.assertEqual(self.client.post(self.url, payload, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(user=self.business)
+        self.assertEqual(self.client.post(self.url, {'offer_detail_ids': [self.details[0].id]}, format='json').status_code,
+                         status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Order.objects.exists())
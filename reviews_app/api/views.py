@@ -1,9 +1,11 @@
+from django.db import transaction
 from rest_framework import status, viewsets, permissions
 from rest_framework.response import Response
 from ..models import Review
 from .serializers import ReviewSerializer
 from .permissions import IsReviewerOrReadOnly
 from offers_app.models import Offer
+from ..ratings import adjust_offer_rating
 
 
 
@@ -35,7 +37,9 @@ class ReviewViewSet(viewsets.ModelViewSet):
         if instance.reviewer != user:
             return Response({'detail': 'Forbidden. Der Benutzer ist nicht berechtigt, diese Bewertung zu löschen.'}, status=status.HTTP_403_FORBIDDEN, content_type="application/json")
 
-        instance.delete()
+        with transaction.atomic():
+            instance.delete()
+            adjust_offer_rating(instance.offer_id, -1, -instance.rating)
         return Response(status=status.HTTP_204_NO_CONTENT, content_type="application/json")
 
     def partial_update(self, request, *args, **kwargs):
@@ -77,9 +81,13 @@ class ReviewViewSet(viewsets.ModelViewSet):
         if not update_data:
             return Response({'detail': 'Es muss mindestens rating oder description gesetzt werden.'}, status=status.HTTP_400_BAD_REQUEST)
 
+        old_rating = instance.rating
         for attr, value in update_data.items():
             setattr(instance, attr, value)
-        instance.save()
+        with transaction.atomic():
+            instance.save()
+            if instance.rating != old_rating:
+                adjust_offer_rating(instance.offer_id, 0, instance.rating - old_rating)
 
         serializer = self.get_serializer(instance)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -107,6 +115,10 @@ class ReviewViewSet(viewsets.ModelViewSet):
         description = request.data.get('description')
         if not business_user_id or rating is None or description is None:
             return Response({'detail': 'business_user, rating und description sind erforderlich.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            rating = int(rating)
+        except (ValueError, TypeError):
+            return Response({'detail': 'Rating muss eine Zahl sein.'}, status=status.HTTP_400_BAD_REQUEST)
 
         # Hole alle Angebote dieses Geschäftsbenutzers
         offers = Offer.objects.filter(business_user_id=business_user_id)
@@ -119,12 +131,14 @@ class ReviewViewSet(viewsets.ModelViewSet):
 
         # Nimm das erste Angebot für die Bewertung (Modell verlangt offer)
         offer = offers.first()
-        review = Review.objects.create(
-            offer=offer,
-            reviewer=user,
-            rating=rating,
-            comment=description
-        )
+        with transaction.atomic():
+            review = Review.objects.create(
+                offer=offer,
+                reviewer=user,
+                rating=rating,
+                comment=description
+            )
+            adjust_offer_rating(offer.id, 1, rating)
         serializer = self.get_serializer(review)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from reviews_app.ratings import recompute_offer_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored rating aggregates of offers from their reviews'
+
+    def handle(self, *args, **options):
+        repaired = recompute_offer_ratings()
+        self.stdout.write(self.style.SUCCESS(f'Repaired rating aggregates of {repaired} offers.'))
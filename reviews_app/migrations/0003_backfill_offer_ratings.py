@@ -0,0 +1,30 @@
+# Generated by Django 5.0 on 2026-10-18 03:05
+
+from django.db import migrations
+from django.db.models import Avg, Count, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_offer_ratings(apps, schema_editor):
+    Offer = apps.get_model('offers_app', 'Offer')
+    Review = apps.get_model('reviews_app', 'Review')
+    reviews = Review.objects.filter(offer=OuterRef('pk')).order_by().values('offer')
+    Offer.objects.update(
+        rating_count=Coalesce(Subquery(reviews.annotate(value=Count('pk')).values('value')), 0),
+        rating_sum=Coalesce(Subquery(reviews.annotate(value=Sum('rating')).values('value')), 0),
+        average_rating=Coalesce(
+            Subquery(reviews.annotate(value=Avg('rating')).values('value')), Value(0.0), output_field=FloatField()
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews_app', '0002_initial'),
+        ('offers_app', '0006_offer_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_offer_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0 on 2026-10-18 03:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('offers_app', '0007_offer_indexes'),
+        ('reviews_app', '0003_backfill_offer_ratings'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['reviewer', '-created_at'], name='reviews_reviewer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['offer', '-created_at'], name='reviews_offer_created_idx'),
+        ),
+    ]
@@ -25,6 +25,10 @@ class Review(models.Model):
         db_table = 'reviews'
         ordering = ['-created_at']
         unique_together = ['offer', 'reviewer']  # One review per user per offer
+        indexes = [
+            models.Index(fields=['reviewer', '-created_at'], name='reviews_reviewer_created_idx'),
+            models.Index(fields=['offer', '-created_at'], name='reviews_offer_created_idx'),
+        ]
 
     def __str__(self):
         return f"Review by {self.reviewer.username} for {self.offer.title} - {self.rating}★"
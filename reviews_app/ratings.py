@@ -0,0 +1,42 @@
+"""Rating aggregates stored on Offer (rating_count, rating_sum, average_rating)."""
+from django.db.models import Avg, Count, F, FloatField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from offers_app.cache import invalidate_offer_lists
+from offers_app.models import Offer
+from .models import Review
+
+
+def adjust_offer_rating(offer_id, count_delta=0, sum_delta=0):
+    """Apply one review change to the stored aggregates of an offer"""
+    count = F('rating_count') + count_delta
+    total = F('rating_sum') + sum_delta
+    # NULLIF turns a division by zero into NULL, which Coalesce maps back to 0
+    average = Coalesce(
+        Cast(total, FloatField()) / NullIf(count, Value(0)),
+        Value(0.0),
+        output_field=FloatField(),
+    )
+    Offer.objects.filter(pk=offer_id).update(rating_count=count, rating_sum=total, average_rating=average)
+    invalidate_offer_lists()
+
+
+def recompute_offer_ratings():
+    """Rebuild the aggregates of every offer whose stored values differ from its reviews, returns their number"""
+    reviews = Review.objects.filter(offer=OuterRef('pk')).order_by().values('offer')
+    actual_count = Coalesce(Subquery(reviews.annotate(value=Count('pk')).values('value')), 0)
+    actual_sum = Coalesce(Subquery(reviews.annotate(value=Sum('rating')).values('value')), 0)
+    actual_average = Coalesce(
+        Subquery(reviews.annotate(value=Avg('rating')).values('value')), Value(0.0), output_field=FloatField()
+    )
+    drifted = list(
+        Offer.objects.annotate(actual_count=actual_count, actual_sum=actual_sum)
+        .exclude(rating_count=F('actual_count'), rating_sum=F('actual_sum'))
+        .values_list('pk', flat=True)
+    )
+    if drifted:
+        Offer.objects.filter(pk__in=drifted).update(
+            rating_count=actual_count, rating_sum=actual_sum, average_rating=actual_average
+        )
+        invalidate_offer_lists()
+    return len(drifted)
@@ -1,10 +1,17 @@
+from io import StringIO
+from unittest import skipUnless
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from profiles_app.models import User
 from offers_app.models import Offer
 from reviews_app.models import Review
+from reviews_app.ratings import adjust_offer_rating
 from rest_framework import status
 from profiles_app.models import CustomerProfile
+from core.testing import full_table_scans
 
 class ReviewTests(APITestCase):
     def test_review_patch_response_structure(self):
@@ -155,3 +162,85 @@ class ReviewTests(APITestCase):
         url = reverse('review-detail', args=[9999])
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ReviewRatingAggregateTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='customer1', password='test123', user_type='customer')
+        self.customer2 = User.objects.create_user(username='customer2', password='test123', user_type='customer')
+        self.business = User.objects.create_user(username='business1', password='test123', user_type='business')
+        self.offer = Offer.objects.create(business_user=self.business, title='Testangebot', description='desc')
+        self.offer.details.create(title='Basic', delivery_time_in_days=5, price=100, offer_type='basic')
+        self.list_url = reverse('review-list')
+
+    def post_review(self, user, rating):
+        self.client.force_authenticate(user=user)
+        data = {'business_user': self.business.id, 'rating': rating, 'description': 'Text'}
+        return self.client.post(self.list_url, data)
+
+    def assertAggregates(self, count, total, average):
+        self.offer.refresh_from_db()
+        self.assertEqual(self.offer.rating_count, count)
+        self.assertEqual(self.offer.rating_sum, total)
+        self.assertAlmostEqual(self.offer.average_rating, average)
+
+    def test_create_update_and_delete_adjust_aggregates(self):
+        first = self.post_review(self.customer, 5)
+        self.post_review(self.customer2, 2)
+        self.assertAggregates(2, 7, 3.5)
+        self.client.force_authenticate(user=self.customer)
+        self.client.patch(reverse('review-detail', args=[first.data['id']]), {'rating': 3})
+        self.assertAggregates(2, 5, 2.5)
+        self.client.delete(reverse('review-detail', args=[first.data['id']]))
+        self.assertAggregates(1, 2, 2.0)
+        self.client.force_authenticate(user=self.customer2)
+        self.client.delete(reverse('review-detail', args=[Review.objects.get().id]))
+        self.assertAggregates(0, 0, 0.0)
+
+    def test_create_rejects_non_numeric_rating(self):
+        response = self.post_review(self.customer, 'gut')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertAggregates(0, 0, 0.0)
+
+    def test_offers_filter_and_order_by_rating(self):
+        self.post_review(self.customer, 4)
+        other = Offer.objects.create(business_user=self.business, title='Zweites', description='desc')
+        other.details.create(title='Basic', delivery_time_in_days=5, price=100, offer_type='basic')
+        Review.objects.create(offer=other, reviewer=self.customer2, rating=2, comment='Ok')
+        adjust_offer_rating(other.id, 1, 2)
+        response = self.client.get(reverse('offer-list'), {'ordering': '-average_rating', 'page_size': 10})
+        self.assertEqual([o['id'] for o in response.data['results']], [self.offer.id, other.id])
+        response = self.client.get(reverse('offer-list'), {'min_rating': 3, 'page_size': 10})
+        self.assertEqual([o['id'] for o in response.data['results']], [self.offer.id])
+
+    def test_recompute_command_repairs_drift(self):
+        Review.objects.create(offer=self.offer, reviewer=self.customer, rating=4, comment='Ok')
+        Review.objects.create(offer=self.offer, reviewer=self.customer2, rating=1, comment='Ok')
+        out = StringIO()
+        call_command('recompute_offer_ratings', stdout=out)
+        self.assertIn('1 offers', out.getvalue())
+        self.assertAggregates(2, 5, 2.5)
+        out = StringIO()
+        call_command('recompute_offer_ratings', stdout=out)
+        self.assertIn('0 offers', out.getvalue())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+class ReviewQueryPlanTests(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(username='customer1', password='test123', user_type='customer')
+        self.business = User.objects.create_user(username='business1', password='test123', user_type='business')
+        offer = Offer.objects.create(business_user=self.business, title='Testangebot', description='desc')
+        Review.objects.create(offer=offer, reviewer=self.customer, rating=4, comment='Gut!')
+
+    def test_filtered_review_lists_use_indexes(self):
+        self.client.force_authenticate(user=self.customer)
+        with CaptureQueriesContext(connection) as context:
+            for params in [{'business_user_id': self.business.id}, {'reviewer_id': self.customer.id}]:
+                self.assertEqual(self.client.get(reverse('review-list'), params).status_code, status.HTTP_200_OK)
+        self.assertEqual(full_table_scans(context.captured_queries), [])
+
+    def test_duplicate_review_check_uses_indexes(self):
+        with CaptureQueriesContext(connection) as context:
+            Review.objects.filter(offer__business_user_id=self.business.id, reviewer=self.customer).exists()
+        self.assertEqual(full_table_scans(context.captured_queries), [])